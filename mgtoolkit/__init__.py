@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from ._version import __version__  # noqa: F401
+
 __author__ = """Dinesha Ranathunga"""
 __email__ = 'mgtkhelp@gmail.com'
-__version__ = '1.0.1'
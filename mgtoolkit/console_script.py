@@ -1,10 +1,6 @@
-import pkg_resources
-import unittest
+from . import _version
 
-try:
-    FCD_VERSION = pkg_resources.get_distribution("mgtoolkit").version
-except pkg_resources.DistributionNotFound:
-    FCD_VERSION = "dev"
+FCD_VERSION = _version.__version__
 
 
 def console_entry():
@@ -13,6 +9,7 @@ def console_entry():
 
 # !! The main function are only here for debug. The real compiler don't need this`!!
 if __name__ == '__main__':
+    import unittest
     unittest.main()
 
 
@@ -1,8 +1,28 @@
+from sys import intern
+
+
+class _ReverseMapping(object):
+    """ Computes the value->name mapping of an enum the first time it is read.
+    """
+
+    def __init__(self, members):
+        self.members = members
+
+    def __get__(self, instance, owner):
+        reverse = {value: key for key, value in self.members.items()}
+        # replace the descriptor so later reads are plain attribute lookups
+        setattr(owner, 'reverse_mapping', reverse)
+        return reverse
+
+
 def enum(*sequential, **named):
     enums = dict(zip(sequential, range(len(sequential))), **named)
-    reverse = dict((value, key) for key, value in enums.iteritems())
-    enums['reverse_mapping'] = reverse
-    return type('Enum', (), enums)
+    # string members are used as attribute keys, interning lets dict probes match on identity
+    for key, value in enums.items():
+        if isinstance(value, str):
+            enums[key] = intern(value)
+    # enums are attribute namespaces only, instances never need a __dict__
+    return type('Enum', (), dict(enums, reverse_mapping=_ReverseMapping(enums), __slots__=()))
 
 GraphAttribute = enum(Type='type', Service='service', Exploits='exploits',
                       Label='label', SubnetIpAddress='subnetip',
@@ -14,5 +34,13 @@ GraphAttribute = enum(Type='type', Service='service', Exploits='exploits',
 # TODO: move to policy API
 Ipv4ProtocolNumbers = enum(all=(0, 255), icmp=1, tcp=6, udp=17, eigrp=88, ospf=89)
 
+# scalar protocol numbers as plain ints; PROTO_ALL expands the 'all' range once for set membership tests
+PROTO_ALL = frozenset(range(Ipv4ProtocolNumbers.all[0], Ipv4ProtocolNumbers.all[1] + 1))
+PROTO_ICMP = Ipv4ProtocolNumbers.icmp
+PROTO_TCP = Ipv4ProtocolNumbers.tcp
+PROTO_UDP = Ipv4ProtocolNumbers.udp
+PROTO_EIGRP = Ipv4ProtocolNumbers.eigrp
+PROTO_OSPF = Ipv4ProtocolNumbers.ospf
+
 RuleEffect = enum(Permit=1, Deny=2)
 
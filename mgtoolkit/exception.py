@@ -1,18 +1,16 @@
 class ApplicationException(Exception):
     """ Application Exception base class"""
-    # the following fails to populate exception.message
-    def __init__(self, *args):
-        # *args is used to get a list of the parameters passed in
-        # noinspection PyPropertyAccess
-        self.args = [a for a in args]
-        # TODO: is there a better way to incorporate inner exception messages?
-        message = ''
-        for arg in self.args:
-            if isinstance(arg, Exception):
-                message = message + ': ' + arg.message
-            else:
-                message = message + ': ' + str(arg)
-        self.message = message
+
+    def __str__(self):
+        args = self.args
+        if len(args) == 1 and type(args[0]) is str:
+            # the common raise SomeException('message') case needs no formatting
+            return args[0]
+        # inner exceptions contribute their own message, everything else its str()
+        return ': '.join(getattr(arg, 'message', None) or str(arg) for arg in args)
+
+    # formatted on demand so that exceptions which are caught and discarded cost nothing extra
+    message = property(__str__)
 
 
 class MetagraphException(ApplicationException):
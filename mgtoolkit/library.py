@@ -1,8 +1,13 @@
-from properties import resources
-from exception import MetagraphException
+from .properties import resources
+from .exception import MetagraphException
 from numpy import matrix
 import copy
+import functools
 import math
+import re
+
+# operators, brackets and whitespace separating the propositions of a logical expression
+_EXPRESSION_DELIMITERS = re.compile(r'[.|!()\s]+')
 
 
 def singleton(cls):
@@ -25,6 +30,9 @@ class Triple(object):
     """ Captures a set of co-inputs, co-outputs and edges between two metagraph elements.
     """
 
+    # one triple is created per edge per adjacency cell, keep them small
+    __slots__ = ('coinputs', 'cooutputs', 'edges')
+
     def __init__(self, coinputs, cooutputs, edges):
         if edges is None:
             raise MetagraphException('edges', resources['value_null'])
@@ -33,36 +41,16 @@ class Triple(object):
         self.cooutputs = cooutputs
         self.edges = edges
 
-    def coinputs(self):
-        """ The co-inputs of the Triple object
-        :return: set
-        """
-        return self.coinputs
-
-    def cooutputs(self):
-        """ The co-outputs of the Triple object
-        :return: set
-        """
-        return self.cooutputs
-
-    def edges(self):
-        """ The edges of the Triple object
-        :return: set
-        """
-        return self.edges
-
     def __repr__(self):
         if isinstance(self.edges, list):
             edge_desc = [repr(edge) for edge in self.edges]
         else:
             edge_desc = [repr(self.edges)]
-        full_desc = ''
-        for desc in edge_desc:
-            if full_desc == '':
-                full_desc = desc
-            else:
-                full_desc += ', ' + desc
-        return 'Triple(%s, %s, %s)' % (self.coinputs, self.cooutputs, full_desc)
+        full_desc = ', '.join(edge_desc)
+        # co-inputs/co-outputs derived from edges are frozensets, print them like plain sets
+        coinputs = set(self.coinputs) if isinstance(self.coinputs, frozenset) else self.coinputs
+        cooutputs = set(self.cooutputs) if isinstance(self.cooutputs, frozenset) else self.cooutputs
+        return 'Triple(%s, %s, %s)' % (coinputs, cooutputs, full_desc)
 
     def __eq__(self, other):
         if other is None:
@@ -72,21 +60,61 @@ class Triple(object):
 
         return (self.coinputs == other.coinputs and
                 self.cooutputs == other.cooutputs and
-                len(self.edges) == len(other.edges) and
                 self.edges == other.edges)
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        # consistent with __eq__, so equal triples collapse in sets
+        return hash((None if self.coinputs is None else frozenset(self.coinputs),
+                     None if self.cooutputs is None else frozenset(self.cooutputs),
+                     _freeze_edges(self.edges)))
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_edge_label(label):
+    """ Splits an edge label of the form 'r <a; b>' into its three parts, see
+    MetagraphHelper.extract_edge_label_components. Labels repeat across edges, so parses are memoised.
+    :param label: string
+    :return: tuple of strings
+    """
+    items = label.replace('>', '').split('<')
+    if len(items) < 2:
+        raise MetagraphException('label', resources['format_invalid'])
+
+    tuples = items[1].split(';')
+    if len(tuples) < 2:
+        raise MetagraphException('label', resources['format_invalid'])
+
+    return items[0], tuples[0], tuples[1]
+
+
+def _freeze_edges(edges):
+    """ Converts a (nested) list of edges into hashable nested tuples.
+    :param edges: Edge object or nested list of Edge objects
+    :return: Edge object or nested tuple of Edge objects
+    """
+    if isinstance(edges, list):
+        return tuple(_freeze_edges(element) for element in edges)
+    return edges
+
 
 class Node(object):
     """ Represents a metagraph node.
     """
 
+    # nodes only carry their element set
+    __slots__ = ('element_set',)
+
     def __init__(self, element_set):
         if element_set is None or len(element_set) == 0:
             raise MetagraphException('element_set', resources['value_null'])
-        if not isinstance(element_set, set):
+        if not isinstance(element_set, (set, frozenset)):
             raise MetagraphException('element_set', resources['format_invalid'])
 
-        self.element_set = element_set
+        # immutable so nodes hash without copying and never change behind a metagraph's back
+        self.element_set = frozenset(element_set)
 
     def get_element_set(self):
         """ Returns the node elements
@@ -95,27 +123,44 @@ class Node(object):
         return self.element_set
 
     def __repr__(self):
-        return 'Node(%s)' % self.element_set
+        return 'Node(%s)' % set(self.element_set)
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return False
+        return self.element_set == other.element_set
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.element_set)
 
 
 class Edge(object):
     """ Represents a metagraph edge.
     """
 
+    # edges are created per metagraph operation, keep them small
+    __slots__ = ('invertex', 'outvertex', 'attributes', 'label', 'attribute_set')
+
     def __init__(self, invertex, outvertex, attributes=None, label=None):
         if invertex is None or len(invertex) == 0:
             raise MetagraphException('invertex', resources['value_null'])
         if outvertex is None or len(outvertex) == 0:
             raise MetagraphException('outvertex', resources['value_null'])
-        if not isinstance(invertex, set):
+        if not isinstance(invertex, (set, frozenset)):
             raise MetagraphException('invertex', resources['format_invalid'])
-        if not isinstance(outvertex, set):
+        if not isinstance(outvertex, (set, frozenset)):
             raise MetagraphException('outvertex', resources['format_invalid'])
 
-        self.invertex = invertex
-        self.outvertex = outvertex
+        # vertices are immutable so edges hash without copying
+        self.invertex = frozenset(invertex)
+        self.outvertex = frozenset(outvertex)
         self.attributes = attributes
         self.label = label
+        # order-free view of the attributes, compared by MetagraphHelper.are_edges_equal
+        self.attribute_set = None if attributes is None else frozenset(attributes)
 
         # include attributes as part if invertex
         if attributes is not None:
@@ -123,28 +168,10 @@ class Edge(object):
             for attribute in attributes:
                 if attribute not in invertex:
                     invertex.append(attribute)
-            self.invertex = set(invertex)
+            self.invertex = frozenset(invertex)
 
     def __repr__(self):
-        return 'Edge(%s, %s)' % (self.invertex, self.outvertex)
-
-    def invertex(self):
-        """ Returns the invertex of the edge.
-        :return: set
-        """
-        return self.invertex
-
-    def outvertex(self):
-        """ Returns the outvertex of the edge.
-        :return: set
-        """
-        return self.outvertex
-
-    def label(self):
-        """ Returns the label of the edge.
-        :return: string
-        """
-        return self.label
+        return 'Edge(%s, %s)' % (set(self.invertex), set(self.outvertex))
 
     def __eq__(self, other):
         if other is None:
@@ -156,6 +183,10 @@ class Edge(object):
                 self.outvertex == other.outvertex and
                 self.attributes == other.attributes)
 
+    def __hash__(self):
+        # consistent with __eq__, edges that compare equal share their vertices
+        return hash((self.invertex, self.outvertex))
+
 
 class Metapath(object):
     """ Represents a metapath between a source and a target node in a metagraph.
@@ -167,36 +198,14 @@ class Metapath(object):
         if target is None or len(target) == 0:
             raise MetagraphException('target', resources['value_null'])
 
-        self.source = source
-        self.target = target
+        # dominance checks rely on set operations, accept any iterable by freezing once
+        self.source = frozenset(source)
+        self.target = frozenset(target)
         self.edge_list = edge_list
 
-    def source(self):
-        """ Returns the source of the metapath.
-        :return: set
-        """
-        return self.source
-
-    def target(self):
-        """ Returns the target of the metapath.
-        :return: set
-        """
-        return self.target
-
-    def edge_list(self):
-        """ Returns the list of edges of the metapath.
-        :return: set
-        """
-        return self.edge_list
-
     def __repr__(self):
         edge_desc = [repr(edge) for edge in self.edge_list]
-        full_desc = 'source: %s, target: %s' % (self.source, self.target)
-        for desc in edge_desc:
-            if full_desc == '':
-                full_desc = desc
-            else:
-                full_desc += ", " + desc
+        full_desc = ', '.join(['source: %s, target: %s' % (set(self.source), set(self.target))] + edge_desc)
         return 'Metapath({ %s })' % full_desc
 
     def dominates(self, metapath):
@@ -213,6 +222,10 @@ class Metapath(object):
         output1 = self.target # C
         output2 = metapath.target # C'
 
+        # a larger set can never be a subset
+        if len(input1) > len(input2) or len(output2) > len(output1):
+            return False
+
         if input1.issubset(input2) and output2.issubset(output1): # B <= B', C' <= C
             return True
 
@@ -232,8 +245,155 @@ class Metagraph(object):
         self.nodes = []
         self.edges = []
         self.generating_set = generator_set
+        # fixed element order for matrix rows/cols, plus element -> row index lookup
+        self._gen_list = list(generator_set)
+        self._gen_index = {x: i for i, x in enumerate(self._gen_list)}
+        # hashable keys of the current nodes/edges for constant time duplicate checks
+        self._node_keys = set()
+        self._edge_keys = set()
+        # number of stored edges per (invertex, outvertex), whatever their labels
+        self._edge_vertices = dict()
+        # derived matrices, recomputed only after the nodes or edges change
+        self._adj_cache = None
+        self._closure_cache = None
+        self._incidence_cache = None
+        self._edge_index = None
+        self._edge_masks = None
+        self._metapath_cache = dict()
         self.a_star = None
 
+    def _invalidate_caches(self):
+        """ Discards the cached edge index and masks, adjacency, closure and incidence matrices and metapaths.
+        :return: None
+        """
+        self._adj_cache = None
+        self._closure_cache = None
+        self._incidence_cache = None
+        self._edge_index = None
+        self._edge_masks = None
+        self._metapath_cache = dict()
+        self.a_star = None
+
+    def _get_edge_index(self):
+        """ Returns a mapping from each (invertex element, outvertex element) pair to the edges joining them.
+        :return: dict
+        """
+        if self._edge_index is None:
+            self._edge_index = dict()
+            for edge in self.edges:
+                for x_i in edge.invertex:
+                    for x_j in edge.outvertex:
+                        self._edge_index.setdefault((x_i, x_j), []).append(edge)
+        return self._edge_index
+
+    @staticmethod
+    def _element_mask(elements, index):
+        """ Packs the given elements into an int bitmask over their indices.
+        :param elements: set
+        :param index: dict
+        :return: int
+        """
+        mask = 0
+        for x in elements:
+            if x in index:
+                mask |= 1 << index[x]
+        return mask
+
+    def _get_edge_masks(self):
+        """ Returns the element index used for the edge bitmasks and the invertex and outvertex
+        bitmasks of the edges, in edge order.
+        :return: tuple of dict and two lists of int
+        """
+        if self._edge_masks is None:
+            # edge elements outside the generating set get bits after the generating set rows
+            index = dict(self._gen_index)
+            for edge in self.edges:
+                for x in edge.invertex.union(edge.outvertex):
+                    if x not in index:
+                        index[x] = len(index)
+            self._edge_masks = (index,
+                                [self._element_mask(edge.invertex, index) for edge in self.edges],
+                                [self._element_mask(edge.outvertex, index) for edge in self.edges])
+        return self._edge_masks
+
+    def _get_closure_list(self):
+        """ Returns the closure matrix, kept in a_star for the metapath queries.
+        :return: list of lists
+        """
+        if self.a_star is None:
+            self.a_star = self._get_closure()
+        return self.a_star
+
+    @staticmethod
+    def _copy_matrix(matrix):
+        """ Returns a copy of the given matrix with fresh rows and cell lists, so callers cannot alter a cached one.
+        :param matrix: list of lists
+        :return: list of lists
+        """
+        return [[None if cell is None else list(cell) for cell in row] for row in matrix]
+
+    @staticmethod
+    def _node_key(node):
+        """ Returns the hashable key identifying a node.
+        :param node: Node object
+        :return: frozenset
+        """
+        return node.element_set
+
+    @staticmethod
+    def _edge_key(edge):
+        """ Returns the hashable key identifying an edge.
+        :param edge: Edge object
+        :return: tuple
+        """
+        return edge.invertex, edge.outvertex, edge.label
+
+    def _add_node_if_new(self, node):
+        """ Appends the node unless an equal node is already present.
+        :param node: Node object
+        :return: None
+        """
+        key = self._node_key(node)
+        if key not in self._node_keys:
+            self._node_keys.add(key)
+            self.nodes.append(node)
+            self._invalidate_caches()
+
+    def _add_edge_if_new(self, edge, match_label=False):
+        """ Appends the edge unless an equal edge is already present. Unless match_label is set,
+        any edge between the same vertices counts as equal, as add_edges_from has always done.
+        :param edge: Edge object
+        :param match_label: boolean
+        :return: None
+        """
+        key = self._edge_key(edge)
+        if key in self._edge_keys:
+            return
+        vertices = (edge.invertex, edge.outvertex)
+        if not match_label and vertices in self._edge_vertices:
+            return
+        self._edge_keys.add(key)
+        self._edge_vertices[vertices] = self._edge_vertices.get(vertices, 0) + 1
+        self.edges.append(edge)
+        self._invalidate_caches()
+
+    def _remove_edge_keys(self, keys):
+        """ Removes the stored edges with the given keys.
+        :param keys: set of edge keys
+        :return: None
+        """
+        keys = keys.intersection(self._edge_keys)
+        if len(keys) == 0:
+            return
+        self._edge_keys.difference_update(keys)
+        for invertex, outvertex, _ in keys:
+            vertices = (invertex, outvertex)
+            self._edge_vertices[vertices] -= 1
+            if self._edge_vertices[vertices] == 0:
+                del self._edge_vertices[vertices]
+        self.edges[:] = [item for item in self.edges if self._edge_key(item) not in keys]
+        self._invalidate_caches()
+
     def add_node(self, node):
         """ Adds a node to the metagraph.
         :param node: Node object
@@ -251,8 +411,7 @@ class Metagraph(object):
         if True in not_found:
             raise MetagraphException('node', resources['range_invalid'])
 
-        if not MetagraphHelper().is_node_in_list(node, self.nodes):
-            self.nodes.append(node)
+        self._add_node_if_new(node)
 
     def remove_node(self, node):
         """ Removes a specified node from the metagraph.
@@ -267,10 +426,13 @@ class Metagraph(object):
         if node is None:
             raise MetagraphException('node', resources['value_null'])
 
-        if not MetagraphHelper().is_node_in_list(node, self.nodes):
+        key = self._node_key(node)
+        if key not in self._node_keys:
             raise MetagraphException('node', resources['value_not_found'])
 
-        self.nodes.remove(node)
+        self._node_keys.remove(key)
+        self.nodes[:] = [item for item in self.nodes if self._node_key(item) != key]
+        self._invalidate_caches()
 
     def add_nodes_from(self, nodes_list):
         """ Adds nodes from the given list to the metagraph.
@@ -286,8 +448,7 @@ class Metagraph(object):
                 raise MetagraphException('nodes_list', resources['format_invalid'])
 
         for node in nodes_list:
-            if not MetagraphHelper().is_node_in_list(node, self.nodes):
-                self.nodes.append(node)
+            self._add_node_if_new(node)
 
     def remove_nodes_from(self, nodes_list):
         """ Removes nodes from the given list from the metagraph.
@@ -299,13 +460,15 @@ class Metagraph(object):
                 raise MetagraphException('nodes_list', resources['value_null'])
 
         for node in nodes_list:
-            if not isinstance(node, set):
+            if not isinstance(node, Node):
                 raise MetagraphException('nodes_list', resources['format_invalid'])
-            if not MetagraphHelper().is_node_in_list(node, self.nodes):
+            if self._node_key(node) not in self._node_keys:
                 raise MetagraphException('nodes_list', resources['value_not_found'])
 
-        for node in nodes_list:
-            self.nodes.remove(node)
+        keys = set(self._node_key(node) for node in nodes_list)
+        self._node_keys.difference_update(keys)
+        self.nodes[:] = [item for item in self.nodes if self._node_key(item) not in keys]
+        self._invalidate_caches()
 
     def add_edge(self, edge):
         """ Adds the given edge to the metagraph.
@@ -317,16 +480,11 @@ class Metagraph(object):
             raise MetagraphException('edge', resources['format_invalid'])
 
         # add to list of nodes first
-        node1 = Node(edge.invertex)
-        node2 = Node(edge.outvertex)
-        if not MetagraphHelper().is_node_in_list(node1, self.nodes):
-            self.nodes.append(node1)
-        if not MetagraphHelper().is_node_in_list(node2, self.nodes):
-            self.nodes.append(node2)
+        self._add_node_if_new(Node(edge.invertex))
+        self._add_node_if_new(Node(edge.outvertex))
 
-        #..then edges
-        if not MetagraphHelper().is_edge_in_list(edge, self.edges):
-            self.edges.append(edge)
+        #..then edges, parallel edges with different labels are kept
+        self._add_edge_if_new(edge, match_label=True)
 
     def remove_edge(self, edge):
         """ Removes the given edge from the metagraph.
@@ -337,9 +495,8 @@ class Metagraph(object):
         if not isinstance(edge, Edge):
             raise MetagraphException('edge', resources['format_invalid'])
 
-        # remove edge
-        if edge in self.edges:
-            self.edges.remove(edge)
+        # remove edge, parallel edges with other labels stay
+        self._remove_edge_keys({self._edge_key(edge)})
 
     def add_edges_from(self, edge_list):
         """ Adds the given list of edges to the metagraph.
@@ -355,14 +512,9 @@ class Metagraph(object):
                 raise MetagraphException('edge', resources['format_invalid'])
 
         for edge in edge_list:
-            node1 = Node(edge.invertex)
-            node2 = Node(edge.outvertex)
-            if not MetagraphHelper().is_node_in_list(node1, self.nodes):
-                self.nodes.append(node1)
-            if not MetagraphHelper().is_node_in_list(node2, self.nodes):
-                self.nodes.append(node2)
-            if edge not in self.edges:
-                self.edges.append(edge)
+            self._add_node_if_new(Node(edge.invertex))
+            self._add_node_if_new(Node(edge.outvertex))
+            self._add_edge_if_new(edge)
 
     def remove_edges_from(self, edge_list):
         """ Removes edges from the given list from the metagraph.
@@ -377,21 +529,7 @@ class Metagraph(object):
             if not isinstance(edge, Edge):
                 raise MetagraphException('edge', resources['format_invalid'])
 
-        for edge in edge_list:
-            if MetagraphHelper().is_edge_in_list(edge, self.edges):
-                self.edges.remove(edge)
-
-    def nodes(self):
-        """ Returns a list of metagraph nodes.
-        :return: list of Node objects
-        """
-        return self.nodes
-
-    def edges(self):
-        """ Returns a list of metagraph edges.
-        :return: list of Edge objects.
-        """
-        return self.edges
+        self._remove_edge_keys(set(self._edge_key(edge) for edge in edge_list))
 
     def get_edges(self, invertex, outvertex):
         """ Retrieves all edges between a given invertex and outvertex.
@@ -405,13 +543,15 @@ class Metagraph(object):
         if outvertex is None:
             raise MetagraphException('outvertex', resources['value_null'])
 
-        result = []
-        if len(self.edges) > 0:
-            for edge in self.edges:
-                if (invertex.issubset(edge.invertex)) and (outvertex.issubset(edge.outvertex)) and (edge not in result):
-                    result.append(edge)
+        if len(invertex) == 0 or len(outvertex) == 0:
+            candidates = self.edges
+        else:
+            # any matching edge connects every (x_i, x_j) pair, so one pair narrows the search
+            candidates = self._get_edge_index().get((next(iter(invertex)), next(iter(outvertex))), [])
 
-        return result
+        # edges are unique by vertices, so no further de-duplication is needed
+        return [edge for edge in candidates
+                if invertex.issubset(edge.invertex) and outvertex.issubset(edge.outvertex)]
 
     @staticmethod
     def get_coinputs(edge, x_i):
@@ -421,14 +561,9 @@ class Metagraph(object):
         :return: set
         """
 
-        coinputs = None
-        all_inputs = edge.invertex
-        if x_i in list(all_inputs):
-            coinputs = list(all_inputs)
-            coinputs.remove(x_i)
-        if coinputs is not None and len(coinputs) > 0:
-            return set(coinputs)
-        return None
+        if x_i not in edge.invertex:
+            return None
+        return edge.invertex.difference({x_i}) or None
 
     @staticmethod
     def get_cooutputs(edge, x_j):
@@ -438,18 +573,13 @@ class Metagraph(object):
         :return: set
         """
 
-        cooutputs = None
-        all_outputs = edge.outvertex
-        if x_j in list(all_outputs):
-            cooutputs = list(all_outputs)
-            cooutputs.remove(x_j)
-        if cooutputs is not None and len(cooutputs) > 0:
-            return set(cooutputs)
-        return None
+        if x_j not in edge.outvertex:
+            return None
+        return edge.outvertex.difference({x_j}) or None
 
     def adjacency_matrix_old(self):
         """ Returns the adjacency matrix of the metagraph.
-        :return: numpy.matrix
+        :return: list of lists
         """
 
         # get matrix size
@@ -459,8 +589,8 @@ class Metagraph(object):
         # one triple for each edge e connecting x_i to x_j
         for i in range(size):
             for j in range(size):
-                x_i = list(self.generating_set)[i]
-                x_j = list(self.generating_set)[j]
+                x_i = self._gen_list[i]
+                x_j = self._gen_list[j]
                 # multiple edges may exist between x_i and x_j
                 edges = self.get_edges({x_i}, {x_j})
                 if len(edges) > 0:
@@ -474,45 +604,44 @@ class Metagraph(object):
 
                     adj_matrix[i][j] = triples_list
 
-        # return adj_matrix
-        # noinspection PyCallingNonCallable
-        return matrix(adj_matrix)
+        return adj_matrix
 
     def adjacency_matrix(self):
         """ Returns the adjacency matrix of the metagraph.
-        :return: numpy.matrix
+        :return: list of lists
+        """
+        return self._copy_matrix(self._get_adjacency_matrix())
+
+    def _get_adjacency_matrix(self):
+        """ Returns the cached adjacency matrix, building it if needed. Callers must not modify it.
+        :return: list of lists
         """
+        if self._adj_cache is not None:
+            return self._adj_cache
+
         # get matrix size
         size = len(self.generating_set)
         adj_matrix = MetagraphHelper().get_null_matrix(size, size)
 
-        # create lookup table
-        count=1
-        triples_lookup=dict()
+        # single pass over the edges, each (x_i, x_j) pair drops a triple straight into its cell
+        index = self._gen_index
         for edge in self.edges:
-             for elt1 in edge.invertex:
-                  for elt2 in edge.outvertex:
-                      coinputs = self.get_coinputs(edge, elt1)
-                      cooutputs = self.get_cooutputs(edge, elt2)
-                      triple = Triple(coinputs, cooutputs, edge)
-                      if (elt1,elt2) not in triples_lookup:
-                         triples_lookup[(elt1,elt2)] = []
-                      triples_lookup[(elt1,elt2)].append(triple)
-                      count+=1
-
-        count=1
-        gen_elts = list(self.generating_set)
-        for i in range(size):
-             for j in range(size):
-                  x_i = gen_elts[i]
-                  x_j = gen_elts[j]
-                  try:
-                      adj_matrix[i][j] = triples_lookup[(x_i,x_j)]
-                  except BaseException,e:
-                      pass
+            for x_i in edge.invertex:
+                i = index.get(x_i)
+                if i is None:
+                    continue
+                coinputs = edge.invertex.difference({x_i}) or None
+                for x_j in edge.outvertex:
+                    j = index.get(x_j)
+                    if j is None:
+                        continue
+                    cooutputs = edge.outvertex.difference({x_j}) or None
+                    if adj_matrix[i][j] is None:
+                        adj_matrix[i][j] = []
+                    adj_matrix[i][j].append(Triple(coinputs, cooutputs, edge))
 
-        # noinspection PyCallingNonCallable
-        return matrix(adj_matrix)
+        self._adj_cache = adj_matrix
+        return self._adj_cache
 
     def equivalent(self, metagraph2):
         """Checks if current metagraph is equivalent to the metagraph provided.
@@ -553,14 +682,14 @@ class Metagraph(object):
             # generating sets are identical..simply add edges
             # size = len(generating_set1)
             for edge in metagraph2.edges:
-                if edge not in self.edges:
-                    self.add_edge(edge)
+                # add_edge skips edges already present via the edge key index
+                self.add_edge(edge)
         else:
             # generating sets overlap but are different...combine generating sets and then add edges
             # combined_generating_set = generating_set1.union(generating_set2)
             for edge in metagraph2.edges:
-                if edge not in self.edges:
-                    self.add_edge(edge)
+                # add_edge skips edges already present via the edge key index
+                self.add_edge(edge)
 
         return self
 
@@ -584,20 +713,27 @@ class Metagraph(object):
            len(generating_set2.difference(generating_set1)) == 0):
             raise MetagraphException('generator_sets', resources['not_identical'])
 
-        adjacency_matrix1 = self.adjacency_matrix().tolist()
-        adjacency_matrix2 = metagraph2.adjacency_matrix().tolist()
+        adjacency_matrix1 = self._get_adjacency_matrix()
+        adjacency_matrix2 = metagraph2._get_adjacency_matrix()
         size = len(generating_set1)
         resultant_adjacency_matrix = MetagraphHelper().get_null_matrix(size, size)
+        # only cells with some k where both A1[i][k] and A2[k][j] are non-empty can be non-empty
+        support = MetagraphHelper().get_product_support(adjacency_matrix1, adjacency_matrix2)
 
         for i in range(size):
             for j in range(size):
+                if not (support[i] >> j) & 1:
+                    continue
                 resultant_adjacency_matrix[i][j] = MetagraphHelper().multiply_components(
-                    adjacency_matrix1, adjacency_matrix2, generating_set1, i, j, size)
+                    adjacency_matrix1, adjacency_matrix2, self._gen_list, i, j, size)
 
         # extract new edge list
         new_edge_list = MetagraphHelper().get_edges_in_matrix(resultant_adjacency_matrix, self.generating_set)
         # clear current edge list and append new
         self.edges = []
+        self._edge_keys = set()
+        self._edge_vertices = dict()
+        self._invalidate_caches()
         if len(new_edge_list) > 0:
             self.add_edges_from(new_edge_list)
 
@@ -605,10 +741,21 @@ class Metagraph(object):
 
     def get_closure(self):
         """ Returns the closure matrix (i.e., A*) of the metagraph.
-        :return: numpy.matrix
+        :return: list of lists
         """
+        return self._copy_matrix(self._get_closure())
 
-        adjacency_matrix = self.adjacency_matrix().tolist()
+    def _get_closure(self):
+        """ Returns the cached closure matrix, building it if needed. Callers must not modify it.
+        :return: list of lists
+        """
+
+        if self._closure_cache is not None:
+            return self._closure_cache
+
+        adjacency_matrix = self._get_adjacency_matrix()
+        # cells unreachable in the plain digraph stay empty in every power of A
+        reachable = MetagraphHelper().get_reachability(adjacency_matrix)
 
         i = 0
         size = len(self.generating_set)
@@ -621,7 +768,8 @@ class Metagraph(object):
             a[i+1] = MetagraphHelper().multiply_adjacency_matrices(a[i],
                                                                    self.generating_set,
                                                                    adjacency_matrix,
-                                                                   self.generating_set)
+                                                                   self.generating_set,
+                                                                   reachable)
             #print('multiply_adjacency_matrices complete')
             a_star = MetagraphHelper().add_adjacency_matrices(a_star,
                                                               self.generating_set,
@@ -631,13 +779,14 @@ class Metagraph(object):
             if a[i+1] == a[i]:
                 break
 
-        # noinspection PyCallingNonCallable
-        return matrix(a_star)
+        self._closure_cache = a_star
+        return self._closure_cache
 
-    def get_all_metapaths_from(self, source, target):
+    def get_all_metapaths_from(self, source, target, limit=None):
         """ Retrieves all metapaths between given source and target in the metagraph.
         :param source: set
         :param target: set
+        :param limit: int, stop after this many metapaths (all if None)
         :return: list of Metapath objects
         """
 
@@ -647,46 +796,67 @@ class Metagraph(object):
             raise MetagraphException('target', resources['value_null'])
 
         # check subset
-        if not source.intersection(self.generating_set) == source:
+        if not source.issubset(self.generating_set):
             raise MetagraphException('source', resources['not_a_subset'])
-        if not target.intersection(self.generating_set) == target:
+        if not target.issubset(self.generating_set):
             raise MetagraphException('target', resources['not_a_subset'])
 
+        # the search walks the source in iteration order and may stop early, so equal
+        # sources iterated differently are cached apart
+        key = (tuple(source), frozenset(target))
+        if key in self._metapath_cache:
+            metapaths = self._metapath_cache[key]
+        elif limit is None:
+            metapaths = self._metapath_cache[key] = self._find_all_metapaths(source, target)
+        else:
+            # partial results are not cached
+            metapaths = self._find_all_metapaths(source, target, limit)
+        if metapaths is None:
+            return None
+        if limit is not None:
+            metapaths = metapaths[:limit]
+        # fresh copies, so callers cannot alter the cached ones
+        return [Metapath(mp.source, mp.target, list(mp.edge_list)) for mp in metapaths]
+
+    def _find_all_metapaths(self, source, target, limit=None):
+        """ Computes all metapaths between given source and target, see get_all_metapaths_from.
+        :param source: set
+        :param target: set
+        :param limit: int, stop after this many metapaths (all if None)
+        :return: list of Metapath objects
+        """
+
         # compute A* first
-        if self.a_star is None:
-            #print('computing closure..')
-            self.a_star = self.get_closure().tolist()
-            #print('closure computation- %s'%(time.time()- start))
+        a_star = self._get_closure_list()
 
         metapaths = []
         all_applicable_input_rows = []
         for x_i in source:
-            index = list(self.generating_set).index(x_i)
+            index = self._gen_index[x_i]
             if index not in all_applicable_input_rows:
                 all_applicable_input_rows.append(index)
 
-        cumulative_output_global = []
-        cumulative_edges_global = []
+        cumulative_output_global = set()
+        cumulative_edges_global = set()
         for i in all_applicable_input_rows:
             mp_exist_for_row=False
-            cumulative_output_local = []
-            cumulative_edges_local = []
+            cumulative_output_local = set()
+            cumulative_edges_local = set()
             for x_j in target:
-                j = list(self.generating_set).index(x_j)
+                j = self._gen_index[x_j]
 
-                if self.a_star[i][j] is not None:
+                if a_star[i][j] is not None:
                     mp_exist_for_row = True
 
                     # x_j is already an output
-                    cumulative_output_local.append(x_j)
-                    triples = MetagraphHelper().get_triples(self.a_star[i][j])
+                    cumulative_output_local.add(x_j)
+                    triples = MetagraphHelper().get_triples(a_star[i][j])
                     for triple in triples:
                         # retain cooutputs
                         output = triple.cooutputs
                         if output is not None:
-                            cumulative_output_local += output
-                        if output is not None:
-                            cumulative_output_global += output
+                            cumulative_output_local.update(output)
+                            cumulative_output_global.update(output)
 
                         #... and edges
                         if isinstance(triple.edges, Edge):
@@ -694,22 +864,19 @@ class Metagraph(object):
                         else:
                             edges = MetagraphHelper().get_edge_list(triple.edges)
 
-                        for edge in edges:
-                            if edge not in cumulative_edges_local:
-                                cumulative_edges_local.append(edge)
-                            if edge not in cumulative_edges_global:
-                                cumulative_edges_global.append(edge)
+                        cumulative_edges_local.update(edges)
+                        cumulative_edges_global.update(edges)
 
             if not mp_exist_for_row:
                continue
 
             # check if cumulative outputs form a cover for the target
-            if set(target).issubset(set(cumulative_output_local)):
-                if set(cumulative_edges_local) not in metapaths:
-                    metapaths.append(set(cumulative_edges_local))
+            if target.issubset(cumulative_output_local):
+                if cumulative_edges_local not in metapaths:
+                    metapaths.append(cumulative_edges_local)
 
-            elif set(target).issubset(set(cumulative_edges_global)):
-                if set(cumulative_edges_global) not in metapaths:
+            elif target.issubset(cumulative_edges_global):
+                if cumulative_edges_global not in metapaths:
                     metapaths.append(set(cumulative_edges_global))
 
             else:
@@ -723,25 +890,86 @@ class Metagraph(object):
             #return result
 
             valid_metapaths = []
-            processed_edge_lists=[]
-            from itertools import combinations
             for metapath in metapaths:
                 if len(metapath)>25:
                    continue
-                all_subsets = sum(map(lambda r: list(combinations(list(metapath), r)), range(1, len(list(metapath))+1)), [])
-                for path in all_subsets:
-                    if len(path) <= len(metapath): # metapaths
-                        edge_list2 = self.get_edge_list2(path)
-                        if len(processed_edge_lists)>0:
-                            if MetagraphHelper().is_edge_list_included(edge_list2,processed_edge_lists):
-                                continue
-                        mp = Metapath(source, target, edge_list2)
-                        if self.is_metapath(mp):
-                            valid_metapaths.append(mp)
+                for path in self._target_covering_subsets(list(metapath), target):
+                    mp = Metapath(source, target, self.get_edge_list2(path))
+                    if self.is_metapath(mp):
+                        valid_metapaths.append(mp)
+                        if limit is not None and len(valid_metapaths) >= limit:
+                            return valid_metapaths
             return valid_metapaths
 
         return None
 
+    @staticmethod
+    def _target_covering_subsets(edges, target):
+        """ Yields the non-empty subsets of the given edges whose outvertices cover the target,
+        in the same order as itertools.combinations over increasing subset sizes.
+        :param edges: list of Edge objects
+        :param target: set
+        :return: generator of tuples of Edge objects
+        """
+        count = len(edges)
+        # outputs reachable from the edges at index k onwards, used to prune hopeless branches
+        remaining_outputs = [set()] * (count + 1)
+        for k in range(count - 1, -1, -1):
+            remaining_outputs[k] = remaining_outputs[k + 1].union(edges[k].outvertex)
+
+        def extend(start, chosen, outputs, size):
+            if len(chosen) == size:
+                if target.issubset(outputs):
+                    yield tuple(chosen)
+                return
+            for k in range(start, count - (size - len(chosen)) + 1):
+                if not target.issubset(outputs.union(remaining_outputs[k])):
+                    # no later edge can supply the missing target elements
+                    break
+                chosen.append(edges[k])
+                for path in extend(k + 1, chosen, outputs.union(edges[k].outvertex), size):
+                    yield path
+                chosen.pop()
+
+        for size in range(1, count + 1):
+            for path in extend(0, [], set(), size):
+                yield path
+
+    @staticmethod
+    def _closed_triple_combinations(triples, allowed):
+        """ Yields the non-empty combinations of the given triples whose co-inputs not covered by their
+        co-outputs all lie in allowed, in the same order as itertools.combinations over increasing sizes.
+        :param triples: list of Triple objects
+        :param allowed: set
+        :return: generator of tuples of Triple objects
+        """
+        count = len(triples)
+        coinputs = [set(triple.coinputs) if triple.coinputs is not None else set() for triple in triples]
+        cooutputs = [set(triple.cooutputs) if triple.cooutputs is not None else set() for triple in triples]
+        # co-outputs available from the triples at index k onwards, used to prune hopeless branches
+        remaining_outputs = [set()] * (count + 1)
+        for k in range(count - 1, -1, -1):
+            remaining_outputs[k] = remaining_outputs[k + 1].union(cooutputs[k])
+
+        def extend(start, chosen, unmet, outputs, size):
+            if len(chosen) == size:
+                if not unmet.difference(outputs):
+                    yield tuple(chosen)
+                return
+            for k in range(start, count - (size - len(chosen)) + 1):
+                next_outputs = outputs.union(cooutputs[k])
+                next_unmet = unmet.union(coinputs[k].difference(allowed))
+                # skip when no later triple can supply the inputs outside allowed
+                if next_unmet.issubset(next_outputs.union(remaining_outputs[k + 1])):
+                    chosen.append(triples[k])
+                    for combination in extend(k + 1, chosen, next_unmet, next_outputs, size):
+                        yield combination
+                    chosen.pop()
+
+        for size in range(1, count + 1):
+            for combination in extend(0, [], set(), set(), size):
+                yield combination
+
     def get_all_metapaths_from200(self, source, target):
         if source is None or len(source) == 0:
             raise MetagraphException('source', resources['value_null'])
@@ -749,29 +977,27 @@ class Metagraph(object):
             raise MetagraphException('target', resources['value_null'])
 
         # check subset
-        if not source.intersection(self.generating_set) == source:
+        if not source.issubset(self.generating_set):
             raise MetagraphException('source', resources['not_a_subset'])
-        if not target.intersection(self.generating_set) == target:
+        if not target.issubset(self.generating_set):
             raise MetagraphException('target', resources['not_a_subset'])
 
         # compute A* first
-        if self.a_star is None:
-            print('computing closure..')
-            self.a_star = self.get_closure().tolist()
+        a_star = self._get_closure_list()
 
         print('find mps')
         metapaths = []
         all_applicable_input_rows = []
         for x_i in source:
-            index = list(self.generating_set).index(x_i)
+            index = self._gen_index[x_i]
             if index not in all_applicable_input_rows:
                 all_applicable_input_rows.append(index)
 
         for x_j in target:
             mp_exists=False
-            j = list(self.generating_set).index(x_j)
+            j = self._gen_index[x_j]
             for i in all_applicable_input_rows:
-                if self.a_star[i][j] is not None:
+                if a_star[i][j] is not None:
                     mp_exists=True
                     break
         if not mp_exists:
@@ -779,10 +1005,10 @@ class Metagraph(object):
 
         metapaths=[]
         for x_j in target:
-            j = list(self.generating_set).index(x_j)
+            j = self._gen_index[x_j]
             triples_set=set()
             for i in all_applicable_input_rows:
-                triples = MetagraphHelper().get_triples(self.a_star[i][j])
+                triples = MetagraphHelper().get_triples(a_star[i][j])
                 triples_set = triples_set.union(set(triples))
                 if MetagraphHelper().forms_cover(triples_set, target, x_j):
                     metapath = MetagraphHelper().get_metapath_from_triples(source, target, triples_set)
@@ -791,8 +1017,8 @@ class Metagraph(object):
         for i in all_applicable_input_rows:
             triples_set=set()
             for x_j in target:
-                j = list(self.generating_set).index(x_j)
-                triples = MetagraphHelper().get_triples(self.a_star[i][j])
+                j = self._gen_index[x_j]
+                triples = MetagraphHelper().get_triples(a_star[i][j])
                 triples_set = triples_set.union(set(triples))
                 if MetagraphHelper().forms_cover(triples_set, target, x_j):
                     metapath = MetagraphHelper().get_metapath_from_triples(source, target, triples_set)
@@ -823,22 +1049,22 @@ class Metagraph(object):
         if metapath_candidate is None:
             raise MetagraphException('metapath_candidate', resources['value_null'])
 
-        all_inputs=[]
-        all_outputs=[]
+        all_outputs = set()
         for edge in metapath_candidate.edge_list:
-            for input_elt in list(edge.invertex):
-                if input_elt not in all_inputs:
-                    all_inputs.append(input_elt)
-            for output_elt in list(edge.outvertex):
-                if output_elt not in all_outputs:
-                    all_outputs.append(output_elt)
-
-        # now check input and output sets
-        if (set(all_inputs).difference(set(all_outputs)).issubset(metapath_candidate.source)) and \
-           set(metapath_candidate.target).issubset(all_outputs):
-            return True
+            all_outputs.update(edge.outvertex)
 
-        return False
+        # the target cover is the cheaper test and rejects most candidates
+        if not all_outputs.issuperset(metapath_candidate.target):
+            return False
+
+        # every input not produced inside the path must come from the source
+        source = metapath_candidate.source
+        for edge in metapath_candidate.edge_list:
+            for input_elt in edge.invertex:
+                if input_elt not in all_outputs and input_elt not in source:
+                    return False
+
+        return True
 
     def is_edge_dominant_metapath(self, metapath):
         """ Checks if the given metapath is an edge-dominant metapath.
@@ -849,20 +1075,36 @@ class Metagraph(object):
         if metapath is None:
             raise MetagraphException('metapath', resources['value_null'])
 
-        from itertools import combinations
+        from itertools import chain, combinations
         # check input metapath is valid
         if not self.is_metapath(metapath):
             return False
 
-        all_subsets = sum(map(lambda r: list(combinations(metapath.edge_list, r)),
-                              range(1, len(metapath.edge_list)+1)), [])
-        # if one proper subset is a metapath then not edge dominant
+        # pack the path's edges into bitmasks so each subset is tested with int ops only
+        index = dict()
+        for edge in metapath.edge_list:
+            for x in edge.invertex.union(edge.outvertex):
+                index.setdefault(x, len(index))
+        for x in set(metapath.source).union(metapath.target):
+            index.setdefault(x, len(index))
+        source_mask = self._element_mask(metapath.source, index)
+        target_mask = self._element_mask(metapath.target, index)
+        in_masks = [self._element_mask(edge.invertex, index) for edge in metapath.edge_list]
+        out_masks = [self._element_mask(edge.outvertex, index) for edge in metapath.edge_list]
+
+        # proper subsets only
+        all_subsets = chain.from_iterable(combinations(range(len(metapath.edge_list)), r)
+                                          for r in range(1, len(metapath.edge_list)))
+        # if one proper subset is a metapath then not edge dominant, same test as is_metapath
         for path in all_subsets:
-            # must be a proper subset
-            if len(path) < len(metapath.edge_list):
-                mp = Metapath(metapath.source, metapath.target, list(path))
-                if self.is_metapath(mp):
-                    return False
+            outputs = 0
+            for e in path:
+                outputs |= out_masks[e]
+            if target_mask & ~outputs:
+                continue
+            available = outputs | source_mask
+            if all(not in_masks[e] & ~available for e in path):
+                return False
 
         return True
 
@@ -875,23 +1117,20 @@ class Metagraph(object):
         if metapath is None:
             raise MetagraphException('metapath', resources['value_null'])
 
-        from itertools import combinations
+        from itertools import chain, combinations
         # check input metapath is valid
         if not self.is_metapath(metapath):
             return False
 
-        # get all proper subsets of subset1
-        all_subsets = sum(map(lambda r: list(combinations(metapath.source, r)), range(1, len(metapath.source)+1)), [])
+        # proper subsets of the source, generated lazily smallest first since those are cheapest to search
+        all_subsets = chain.from_iterable(combinations(metapath.source, r) for r in range(1, len(metapath.source)))
         # if one proper subset has a metapath to subset2 then not input dominant
         for subset in all_subsets:
-            # must be proper subset
-            if len(subset) < len(metapath.source):
-                if isinstance(subset, tuple):
-                    subset = set(list(subset))
-                metapath1 = self.get_all_metapaths_from(subset, metapath.target)
-                if metapath1 is not None and len(metapath1) > 0:
-                    #print('source: %s, target: %s'%(subset, metapath.target))
-                    return False
+            # one metapath is enough to rule out dominance
+            metapath1 = self.get_all_metapaths_from(set(subset), metapath.target, limit=1)
+            if metapath1 is not None and len(metapath1) > 0:
+                #print('source: %s, target: %s'%(subset, metapath.target))
+                return False
         return True
 
     def is_dominant_metapath(self, metapath):
@@ -936,8 +1175,9 @@ class Metagraph(object):
         if not self.is_metapath(metapath):
             raise MetagraphException('metapath', resources['arguments_invalid'])
 
-        from itertools import combinations
-        all_subsets = sum(map(lambda r: list(combinations(target, r)), range(1, len(target)+1)), [])
+        from itertools import chain, combinations
+        # proper subsets only
+        all_subsets = chain.from_iterable(combinations(target, r) for r in range(1, len(target)))
         # get all metapaths from subset1 to proper subsets of subset2
         for subset in all_subsets:
             if len(subset) < len(target):
@@ -968,20 +1208,25 @@ class Metagraph(object):
         if target is None:
             raise MetagraphException('target', resources['value_null'])
 
-        # get all metapaths
+        # a cutset separates a connected source and target
         metapaths = self.get_all_metapaths_from(source, target)
-        if metapaths is not None and len(metapaths)>0:
-           for metapath in metapaths:
-                updated = MetagraphHelper().remove_edge_list(edge_list, metapath.edge_list)
-                mpc = Metapath(source, target, updated)
-                if self.is_metapath(mpc):
-                    # not a cutset
-                    return False
+        if metapaths is None or len(metapaths) == 0:
+            return False
 
-           # is a cutset
-           return True
+        return self._breaks_all_metapaths(edge_list, metapaths)
 
-        return False
+    def _breaks_all_metapaths(self, edge_list, metapaths):
+        """ Checks whether removing an edge list leaves none of the given metapaths a metapath.
+        :param edge_list: list of Edge objects
+        :param metapaths: list of Metapath objects
+        :return: boolean
+        """
+        helper = MetagraphHelper()
+        for metapath in metapaths:
+            updated = helper.remove_edge_list(edge_list, metapath.edge_list)
+            if self.is_metapath(Metapath(metapath.source, metapath.target, updated)):
+                return False
+        return True
 
     def get_minimal_cutset(self, source, target):
         """ Retrieves the minimal cutset between a given source and target.
@@ -999,23 +1244,24 @@ class Metagraph(object):
         if metapaths is None or len(metapaths) == 0:
             return None
 
-        cutsets = []
         from itertools import combinations
-        # noinspection PyTypeChecker
-        for metapath in metapaths:
-            all_combinations = sum(map(lambda r: list(combinations(metapath.edge_list, r)),
-                                   range(1, len(metapath.edge_list)+1)), [])
-            for combination in all_combinations:
-                if self.is_cutset(list(combination), source, target) and list(combination) not in cutsets:
-                    cutsets.append(list(combination))
-
-        # return smallest cutset
-        if len(cutsets) > 0:
-            smallest = cutsets[0]
-            for cutset in cutsets:
-                if len(cutset) < len(smallest):
-                    smallest = cutset
-            return smallest
+        metapath_keys = [set(self._edge_key(edge) for edge in metapath.edge_list) for metapath in metapaths]
+        largest = max(len(metapath.edge_list) for metapath in metapaths)
+        tested = set()
+
+        # the first cutset found in increasing size order is the smallest
+        for r in range(1, largest+1):
+            for metapath in metapaths:
+                for combination in combinations(metapath.edge_list, r):
+                    keys = frozenset(self._edge_key(edge) for edge in combination)
+                    if keys in tested:
+                        continue
+                    tested.add(keys)
+                    # a cutset must break every metapath
+                    if any(keys.isdisjoint(mp_keys) for mp_keys in metapath_keys):
+                        continue
+                    if self._breaks_all_metapaths(list(combination), metapaths):
+                        return list(combination)
 
         return None
 
@@ -1053,11 +1299,11 @@ class Metagraph(object):
         # step1. reduce A* by removing unwanted rows, cols
         applicable_rows_and_cols = []
         for x_i in generator_subset:
-            index = list(self.generating_set).index(x_i)
+            index = self._gen_index[x_i]
             if index not in applicable_rows_and_cols:
                 applicable_rows_and_cols.append(index)
 
-        a_star = self.get_closure().tolist()
+        a_star = self._get_closure_list()
 
         # sort list
         applicable_rows_and_cols = sorted(applicable_rows_and_cols)
@@ -1074,8 +1320,12 @@ class Metagraph(object):
             m += 1
 
         # step2. create list L from edges in E (not E') s.t. V_e is a subset of X'
+        subset_elements = set(generator_subset)
         edge_list1 = []
+        selected_edges = set()
         all_triples = []
+        # all_triples bucketed by the fields are_triples_equal matches exactly
+        triple_buckets = dict()
         k = len(applicable_rows_and_cols)
         for i in range(k):
             for j in range(k):
@@ -1084,92 +1334,81 @@ class Metagraph(object):
                     for triple in triples:
                         if isinstance(triple.edges, Edge):
                             new_triple = Triple(triple.coinputs, triple.cooutputs, [triple.edges])
-                            if not MetagraphHelper().is_triple_in_list(new_triple,all_triples):
-                                all_triples.append(new_triple)
                             edges = MetagraphHelper().extract_edge_list([triple.edges])
                         else:
-                            if not MetagraphHelper().is_triple_in_list(triple,all_triples):
-                                all_triples.append(triple)
+                            new_triple = triple
                             edges = MetagraphHelper().extract_edge_list(triple.edges)
+                        bucket = triple_buckets.setdefault(MetagraphHelper()._triple_key(new_triple), [])
+                        if not MetagraphHelper().is_triple_in_list(new_triple, bucket):
+                            bucket.append(new_triple)
+                            all_triples.append(new_triple)
 
                         # select edges with invertices in generator_subset
                         for edge in edges:
-                            if edge.invertex.issubset(set(generator_subset)) and ([edge] not in edge_list1):
+                            if edge.invertex.issubset(subset_elements) and (edge not in selected_edges):
+                                selected_edges.add(edge)
                                 edge_list1.append([edge])
 
         # step3. find combinations of triples s.t. union(CI_t_i)\ union(CO_t_i) is a subset of generator_subset
-        from itertools import combinations
-        all_combinations = sum(map(lambda r: list(combinations(all_triples, r)), range(1, len(all_triples)+1)), [])
-        for combination in all_combinations:
-            coinput = MetagraphHelper().get_coinputs_from_triples(combination)
-            cooutput = MetagraphHelper().get_cooutputs_from_triples(combination)
-            diff = set(coinput).difference(set(cooutput))
-            if diff.issubset(set(generator_subset)):
-                # add edges in combination to L
-                edges2 = MetagraphHelper().get_edges_from_triple_list(list(combination))
-                included = MetagraphHelper().is_edge_list_included_recursive(edges2, edge_list1)
-                if not included:
-                    edge_list1.append(edges2)
+        for combination in self._closed_triple_combinations(all_triples, subset_elements):
+            # add edges in combination to L
+            edges2 = MetagraphHelper().get_edges_from_triple_list(list(combination))
+            included = MetagraphHelper().is_edge_list_included_recursive(edges2, edge_list1)
+            if not included:
+                edge_list1.append(edges2)
 
         # step4. construct L0 from L
         triples_list_l0 = []
+        seen_triples = set()
         for element in edge_list1:
             all_inputs = MetagraphHelper().get_netinputs(element)
             all_outputs = MetagraphHelper().get_netoutputs(element)
-            net_inputs = list(set(all_inputs).difference(all_outputs))
-            net_outputs = all_outputs
-            new_triple = Triple(set(net_inputs), set(net_outputs), element)
-            if new_triple not in triples_list_l0:
-                triples_list_l0.append(new_triple)
+            net_inputs = set(all_inputs).difference(all_outputs)
+            net_outputs = set(all_outputs)
+            # same fields Triple.__eq__ compares
+            key = (frozenset(net_inputs), frozenset(net_outputs), tuple(element))
+            if key not in seen_triples:
+                seen_triples.add(key)
+                triples_list_l0.append(Triple(net_inputs, net_outputs, element))
 
         # step5. reduce L0
-        to_eliminate = []
+        # pack each triple's edges, and its elements within X', into int bitmasks once
+        edge_bits = dict()
+        element_bits = dict((x, 1 << k) for k, x in enumerate(subset_elements))
+        edge_masks = dict()
+        output_masks = dict()
+        input_masks = dict()
+        for triple in triples_list_l0:
+            mask = 0
+            for edge in MetagraphHelper().get_edge_list(triple.edges):
+                if edge not in edge_bits:
+                    edge_bits[edge] = 1 << len(edge_bits)
+                mask |= edge_bits[edge]
+            edge_masks[id(triple)] = mask
+            output_masks[id(triple)] = sum(element_bits[x] for x in triple.cooutputs if x in element_bits)
+            input_masks[id(triple)] = sum(element_bits[x] for x in triple.coinputs if x in element_bits)
+
+        # triples of L0 are distinct here, so they are tracked by identity
+        to_eliminate = set()
         for i in triples_list_l0:
+            edges_i = edge_masks[id(i)]
+            # outputs of i within X'
+            outputs_i = output_masks[id(i)]
             for j in triples_list_l0:
-                if i != j:
-                    # check if i is subsumed by j
-                    edges_i = MetagraphHelper().get_edge_list(i.edges)
-                    edges_j = MetagraphHelper().get_edge_list(j.edges)
-                    outputs_i = i.cooutputs
-                    outputs_j = j.coinputs
-
-                    # check j's edges are a subset of i's edges
-                    subset = True
-                    for edge in edges_j:
-                        if edge not in edges_i:
-                            subset = False
-                            break
-
-                    inclusive = True
-                    if subset:
-                        # edges form a subset..check outputs are inclusive
-                        outputs_j_in_x = []
-                        for output in outputs_j:
-                            if (output in generator_subset) and (output not in outputs_j_in_x):
-                                outputs_j_in_x.append(output)
-
-                        outputs_i_in_x = []
-                        for output in outputs_i:
-                            if (output in generator_subset) and (output not in outputs_i_in_x):
-                                outputs_i_in_x.append(output)
+                if i is not j:
+                    # check if i is subsumed by j: j's edges are a subset of i's edges
+                    # and the outputs are inclusive (compared against j's inputs)
+                    if not edge_masks[id(j)] & ~edges_i and not outputs_i & ~input_masks[id(j)]:
+                        to_eliminate.add(id(i))
+                        break
 
-                        for output in outputs_i_in_x:
-                            if output not in outputs_j_in_x:
-                                inclusive = False
-                                break
-
-                        if inclusive and (i not in to_eliminate):
-                            to_eliminate.append(i)
-                            break
+        triples_list_l0 = [triple for triple in triples_list_l0 if id(triple) not in to_eliminate]
 
-        for elt in to_eliminate:
-            triples_list_l0.remove(elt)
-
-        to_drop = []
+        to_drop = set()
 
         for i in triples_list_l0:
             for j in triples_list_l0:
-                if i != j:
+                if i is not j:
                     inputs_i = i.coinputs
                     inputs_j = j.coinputs
                     outputs_i = i.cooutputs
@@ -1192,81 +1431,18 @@ class Metagraph(object):
                         if output_subset:
                             for elt in j.cooutputs:
                                 i.cooutputs.remove(elt)
-                            if (i.cooutputs is None or len(i.cooutputs) == 0) and (i not in to_drop):
-                                to_drop.append(i)
+                            if i.cooutputs is None or len(i.cooutputs) == 0:
+                                to_drop.add(id(i))
 
-        for item in to_drop:
-            triples_list_l0.remove(item)
+        triples_list_l0 = [triple for triple in triples_list_l0 if id(triple) not in to_drop]
 
         #step6. merge triples based on identical inputs and outputs
-        triples_to_merge = dict()
-        index = 0
-        for triple1 in triples_list_l0:
-            for triple2 in triples_list_l0:
-                if triple1 != triple2:
-                    # merge if same input and output
-                    if triple1.coinputs == triple2.coinputs and triple1.cooutputs == triple2.cooutputs:
-                        if index not in triples_to_merge:
-                            triples_to_merge[index] = []
-                        if triple2 not in triples_to_merge[index]:
-                            triples_to_merge[index].append(triple2)
-            index += 1
-
-        post_merge_triples = dict()
-        for index, triples_list in triples_to_merge.iteritems():
-            triple1 = triples_to_merge[index]
-            if triple1 in triples_list_l0:
-                triples_list_l0.remove(triple1)
-                for triple2 in triples_list:
-                    if triple2 in triples_list_l0:
-                        triples_list_l0.remove(triple2)
-                    if index not in post_merge_triples:
-                        post_merge_triples[index] = Triple(triple1.coinputs, triple1.cooutputs,
-                                                           [triple1.edges, triple2.edges])
-                    else:
-                        post_merge_triples[index].edges.append(triple2.edges)
-                triples_list_l0.append(post_merge_triples[index])
+        triples_list_l0 = self._merge_triple_groups(
+            triples_list_l0, lambda triple: (frozenset(triple.coinputs), frozenset(triple.cooutputs)))
 
         #step7. and triples with identical inputs only
-        triples_to_merge = dict()
-        index = 0
-        for triple1 in triples_list_l0:
-            for triple2 in triples_list_l0:
-                if triple1 != triple2:
-                    # merge if same input
-                    if triple1.coinputs == triple2.coinputs:
-                        if index not in triples_to_merge:
-                            triples_to_merge[index] = []
-                        if triple2 not in triples_to_merge[index]:
-                            triples_to_merge[index].append(triple2)
-            index += 1
-
-        triple_list_l0_copy = copy.copy(triples_list_l0)
-
-        post_merge_triples = dict()
-        for index, triples_list in triples_to_merge.iteritems():
-            triple1 = triple_list_l0_copy[index]
-            if triple1 in triples_list_l0:
-                triples_list_l0.remove(triple1)
-                for triple2 in triples_list:
-                    if triple2 in triples_list_l0:
-                        triples_list_l0.remove(triple2)
-                    if index not in post_merge_triples:
-                        edges_to_merge = list(triple1.edges)
-                        for elt in list(triple2.edges):
-                            if elt not in edges_to_merge:
-                                edges_to_merge.append(elt)
-                        post_merge_triples[index] = Triple(triple1.coinputs, triple1.cooutputs.union(triple2.cooutputs),
-                                                           edges_to_merge)
-                    else:
-                        edges_to_merge = list(post_merge_triples[index].edges)
-                        for elt in list(triple2.edges):
-                            if elt not in edges_to_merge:
-                                edges_to_merge.append(elt)
-                        post_merge_triples[index] = Triple(post_merge_triples[index].coinputs,
-                                                           post_merge_triples[index].cooutputs.union(triple2.cooutputs),
-                                                           edges_to_merge)  # triple1
-                triples_list_l0.append(post_merge_triples[index])
+        triples_list_l0 = self._merge_triple_groups(
+            triples_list_l0, lambda triple: frozenset(triple.coinputs))
 
         temp_list = []
         for triple in triples_list_l0:
@@ -1300,135 +1476,173 @@ class Metagraph(object):
         return mg
 
     def incidence_matrix(self):
-        """ Gets the metagraph projection for a subset of the generating set.
+        """ Returns the incidence matrix of the metagraph.
         :return: numpy.matrix
         """
 
+        # callers get their own copy of the cached matrix
+        if self._incidence_cache is not None:
+            return self._incidence_cache.copy()
+
         rows = len(self.generating_set)
         cols = len(self.edges)
 
         incidence_matrix = MetagraphHelper().get_null_matrix(rows, cols)
 
-        for i in range(rows):
-            x_i = list(self.generating_set)[i]
-            for j in range(cols):
-                e_j = self.edges[j]
-                if x_i in e_j.invertex:
-                    incidence_matrix[i][j] = -1
-                elif x_i in e_j.outvertex:
-                    incidence_matrix[i][j] = 1
-                else:
-                    incidence_matrix[i][j] = None
+        # one pass per edge column, only the cells of its own elements are touched
+        index = self._gen_index
+        for j in range(cols):
+            e_j = self.edges[j]
+            for x in e_j.outvertex:
+                if x in index:
+                    incidence_matrix[index[x]][j] = 1
+            # an element on both sides counts as an input
+            for x in e_j.invertex:
+                if x in index:
+                    incidence_matrix[index[x]][j] = -1
 
         # noinspection PyCallingNonCallable
-        return matrix(incidence_matrix)
+        self._incidence_cache = matrix(incidence_matrix)
+        return self._incidence_cache.copy()
+
+    def _incidence_array(self):
+        """ Returns the incidence matrix as an int8 array, with 0 in place of None.
+        :return: numpy.ndarray
+        """
+        from numpy import zeros, int8
+
+        incidence = zeros((len(self.generating_set), len(self.edges)), dtype=int8)
+        index = self._gen_index
+        for j, e_j in enumerate(self.edges):
+            for x in e_j.outvertex:
+                if x in index:
+                    incidence[index[x], j] = 1
+            # an element on both sides counts as an input
+            for x in e_j.invertex:
+                if x in index:
+                    incidence[index[x], j] = -1
+        return incidence
 
     def get_inverse(self):
         """ Gets the inverse metagraph.
         :return: Metagraph object
         """
 
-        incidence_m = self.incidence_matrix().tolist()
+        from numpy import flatnonzero
+        incidence_m = self._incidence_array()
+        negative = incidence_m == -1
+        positive = incidence_m == 1
+
+        # the inverse uses the edge descriptions as its elements
+        edge_reprs = [repr(edge) for edge in self.edges]
 
         edge_list = []
         # step1: extract indices
-        col_index = 0
-        for i in range(len(incidence_m[0])):
-            negative_item_indices = []
-            positive_item_indices = []
-            column = [row[col_index] for row in incidence_m]
-            row_index = 0
-            for item1 in column:
-                if item1 == -1:
-                   # get all elements with +1 across the row
-                    row = incidence_m[row_index]
-                    eligible = []
-                    local_index = 0
-                    for item2 in row:
-                        if item2 == 1 and local_index not in eligible:
-                            eligible.append(local_index)
-                        local_index += 1
-
-                    if len(eligible) == 0:
-                        row_index += 1  # debug dr check this
-                        continue
-
-                    # TODO: how do we handle multiple occurrences of +1?
-                    # keep a track of -1 and + 1 indices
-                    if (row_index, col_index) not in negative_item_indices:
-                        negative_item_indices.append((row_index, col_index))
-
-                    for local_index in eligible:
-                        if (row_index, local_index) not in positive_item_indices:
-                            positive_item_indices.append((row_index, local_index))
-
-                row_index += 1
-
-            # construct edges from indices
-            invertex = []
+        for col_index in range(incidence_m.shape[1]):
             outvertex = []
+            invertex = []
             edge_label = None
-            for negative_item_index in negative_item_indices:
-                if repr(self.edges[negative_item_index[1]]) not in outvertex:
-                    outvertex.append(repr(self.edges[negative_item_index[1]]))
-
-            for positive_item_index in positive_item_indices:
-                if repr(self.edges[positive_item_index[1]]) not in invertex:
-                    invertex.append(repr(self.edges[positive_item_index[1]]))
-
-                # generate label
-                if edge_label is None:
-                    edge_label = '<%s,%s>' % (list(self.generating_set)[positive_item_index[0]],
-                                              repr(self.edges[positive_item_index[1]]))
-                else:
-                    edge_label += ', <%s,%s>' % (list(self.generating_set)[positive_item_index[0]],
-                                                 repr(self.edges[positive_item_index[1]]))
+            for row_index in flatnonzero(negative[:, col_index]):
+                # get all elements with +1 across the row
+                eligible = flatnonzero(positive[row_index])
+                if len(eligible) == 0:
+                    continue
+
+                # TODO: how do we handle multiple occurrences of +1?
+                if len(outvertex) == 0:
+                    outvertex.append(edge_reprs[col_index])
+
+                for local_index in eligible:
+                    edge_repr = edge_reprs[local_index]
+                    if edge_repr not in invertex:
+                        invertex.append(edge_repr)
+
+                    # generate label
+                    if edge_label is None:
+                        edge_label = '<%s,%s>' % (self._gen_list[row_index], edge_repr)
+                    else:
+                        edge_label += ', <%s,%s>' % (self._gen_list[row_index], edge_repr)
 
-            if invertex is not None and outvertex is not None and len(invertex) > 0 and len(outvertex) > 0:
+            if len(invertex) > 0 and len(outvertex) > 0:
                 edge = Edge(set(invertex), set(outvertex), None, edge_label)
                 if edge not in edge_list:
                     edge_list.append(edge)
-            col_index += 1
 
         # compress the edges
+        groups = dict()
+        for edge in edge_list:
+            groups.setdefault((edge.invertex, edge.label), []).append(edge)
+
         compressed_edges = []
+        compressed_keys = set()
         for edge1 in edge_list:
-            compressed = False
-            for edge2 in edge_list:
-                if edge1 != edge2:
-                    if edge1.invertex == edge2.invertex and edge1.label == edge2.label:
-                        new_edge = Edge(edge1.invertex, edge1.outvertex.union(edge2.outvertex), None, edge1.label)
-                        if not MetagraphHelper().is_edge_in_list(new_edge, compressed_edges):
-                            compressed_edges.append(new_edge)
-                        compressed = True
-            if not compressed and (not MetagraphHelper().is_edge_in_list(edge1, compressed_edges)):
-                compressed_edges.append(edge1)
+            candidates = [Edge(edge1.invertex, edge1.outvertex.union(edge2.outvertex), None, edge1.label)
+                          for edge2 in groups[(edge1.invertex, edge1.label)] if edge2 is not edge1]
+            for new_edge in candidates or [edge1]:
+                key = (new_edge.invertex, new_edge.outvertex, new_edge.label)
+                if key not in compressed_keys:
+                    compressed_keys.add(key)
+                    compressed_edges.append(new_edge)
 
         # add links to alpha and beta
-        row_index = 0
-        occurrences = lambda s, lst: (y for y, e in enumerate(lst) if e == s)
-        for row in incidence_m:
-            if row.__contains__(-1) and (not row.__contains__(1)):
-                col_indices = list(occurrences(-1, row))
-                for col_index in col_indices:
-                    label = '<%s, alpha>' % (list(self.generating_set)[row_index])
-                    new_edge = Edge({'alpha'}, {repr(self.edges[col_index])}, None, label)
-                    if not MetagraphHelper().is_edge_in_list(new_edge, compressed_edges):
+        has_negative = negative.any(axis=1)
+        has_positive = positive.any(axis=1)
+        for row_index in range(incidence_m.shape[0]):
+            if has_negative[row_index] and not has_positive[row_index]:
+                for col_index in flatnonzero(negative[row_index]):
+                    label = '<%s, alpha>' % (self._gen_list[row_index])
+                    new_edge = Edge({'alpha'}, {edge_reprs[col_index]}, None, label)
+                    key = (new_edge.invertex, new_edge.outvertex, label)
+                    if key not in compressed_keys:
+                        compressed_keys.add(key)
                         compressed_edges.append(new_edge)
 
-            elif row.__contains__(1) and (not row.__contains__(-1)):
-                col_indices = list(occurrences(1, row))
-                for col_index in col_indices:
-                    label = '<%s, %s>' % (list(self.generating_set)[row_index], repr(self.edges[col_index]))
-                    new_edge = Edge({repr(self.edges[col_index])}, {'beta'}, None, label)
-                    if not MetagraphHelper().is_edge_in_list(new_edge, compressed_edges):
+            elif has_positive[row_index] and not has_negative[row_index]:
+                for col_index in flatnonzero(positive[row_index]):
+                    label = '<%s, %s>' % (self._gen_list[row_index], edge_reprs[col_index])
+                    new_edge = Edge({edge_reprs[col_index]}, {'beta'}, None, label)
+                    key = (new_edge.invertex, new_edge.outvertex, label)
+                    if key not in compressed_keys:
+                        compressed_keys.add(key)
                         compressed_edges.append(new_edge)
-            row_index += 1
 
         mg = Metagraph(MetagraphHelper().get_generating_set(compressed_edges))
         mg.add_edges_from(compressed_edges)
         return mg
 
+    @staticmethod
+    def _merge_triple_groups(triples, group_key):
+        """ Merges the triples that share a group key into one triple per group.
+        :param triples: list of Triple objects
+        :param group_key: function mapping a Triple object to a hashable key
+        :return: list of Triple objects
+        """
+
+        groups = dict()
+        order = []
+        for triple in triples:
+            key = group_key(triple)
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(triple)
+
+        # unmerged triples keep their place, merged ones follow in group order
+        result = [group[0] for group in (groups[key] for key in order) if len(group) == 1]
+        for key in order:
+            group = groups[key]
+            if len(group) > 1:
+                cooutputs = set()
+                edges = []
+                for triple in group:
+                    cooutputs.update(triple.cooutputs)
+                    for edge in triple.edges:
+                        if edge not in edges:
+                            edges.append(edge)
+                result.append(Triple(group[0].coinputs, cooutputs, edges))
+
+        return result
+
     def get_efm(self, generator_subset):
         """ Gets the element-flow metagraph.
         :param generator_subset: set
@@ -1438,13 +1652,12 @@ class Metagraph(object):
         if generator_subset is None or len(generator_subset) == 0:
             raise MetagraphException('generator_subset', resources['value_null'])
 
-        incidence_m = self.incidence_matrix().tolist()
-        excluded = self.generating_set.difference(generator_subset)
+        incidence_m = self._incidence_array()
 
         # compute G1 and G2
         applicable_rows = []
         for x_i in generator_subset:
-            index = list(self.generating_set).index(x_i)
+            index = self._gen_index[x_i]
             if index not in applicable_rows:
                 applicable_rows.append(index)
 
@@ -1452,35 +1665,20 @@ class Metagraph(object):
         applicable_rows = sorted(applicable_rows)
         inapplicable_rows = sorted(set(range(len(self.generating_set))).difference(applicable_rows))
 
-        rows1 = len(generator_subset)
-        cols1 = len(incidence_m[0])
-        rows2 = len(excluded)
-        g1 = MetagraphHelper().get_null_matrix(rows1, cols1)
-        g2 = MetagraphHelper().get_null_matrix(rows2, cols1)
-
-        m = 0
-        for i in applicable_rows:
-            n = 0
-            for j in range(cols1):
-                g1[m][n] = incidence_m[i][j]
-                n += 1
-            m += 1
-
-        m = 0
-        for i in inapplicable_rows:
-            n = 0
-            for j in range(cols1):
-                g2[m][n] = incidence_m[i][j]
-                n += 1
-            m += 1
-
-        g1_t = MetagraphHelper().transpose_matrix(g1)
+        g1_t = incidence_m[applicable_rows].T.tolist()
+        g2 = incidence_m[inapplicable_rows].tolist()
         mult_r = MetagraphHelper().custom_multiply_matrices(g2, g1_t, self.edges)
+        applicable_values = [self._gen_list[i] for i in applicable_rows]
         row_index = 0
         edge_list = []
+        edge_index = dict()
         lookup = dict()
         for row in mult_r:
-            col_index = 0
+            # equal cells resolve to the column where they first occur
+            first_index = dict()
+            for k, elt2 in enumerate(row):
+                first_index.setdefault(frozenset(elt2), k)
+
             invertices = []
             outvertices = []
             for elt in row:
@@ -1488,62 +1686,68 @@ class Metagraph(object):
                     extracted = list(elt)[0]
                     if 1 in extracted:
                         invertex = []
-                        local_indices = [row.index(elt2) for elt2 in row if elt.issubset(elt2)]
-                        for local_index in local_indices:
-                            value = list(self.generating_set)[applicable_rows[local_index]]
-                            if value not in invertex:
-                                invertex.append(value)
+                        for elt2 in row:
+                            if elt.issubset(elt2):
+                                value = applicable_values[first_index[frozenset(elt2)]]
+                                if value not in invertex:
+                                    invertex.append(value)
 
                         if set(invertex) not in invertices:
                             invertices.append(set(invertex))
-                        if repr(invertex) not in lookup:
-                            lookup[repr(invertex)] = extracted[1]
+                        key = frozenset(invertex)
+                        if key not in lookup:
+                            lookup[key] = extracted[1]
 
                     elif -1 in extracted:
                         outvertex = []
-                        local_indices = [row.index(elt2) for elt2 in row if elt.issubset(elt2)]
-                        for local_index in local_indices:
-                            value = list(self.generating_set)[applicable_rows[local_index]]
-                            if value not in outvertex:
-                                outvertex.append(value)
+                        for elt2 in row:
+                            if elt.issubset(elt2):
+                                value = applicable_values[first_index[frozenset(elt2)]]
+                                if value not in outvertex:
+                                    outvertex.append(value)
 
                         if set(outvertex) not in outvertices:
                             outvertices.append(set(outvertex))
-                        if repr(outvertex) not in lookup:
-                            lookup[repr(outvertex)] = extracted[1]
-
-                col_index += 1
+                        key = frozenset(outvertex)
+                        if key not in lookup:
+                            lookup[key] = extracted[1]
 
             # combine the invertices and outvertices
             for invertex in invertices:
                 for outvertex in outvertices:
                     # create flow composition
-                    label = '%s <%s; %s>' % (list(self.generating_set)[inapplicable_rows[row_index]],
-                                             lookup[repr(list(invertex))], lookup[repr(list(outvertex))])
+                    label = '%s <%s; %s>' % (self._gen_list[inapplicable_rows[row_index]],
+                                             lookup[frozenset(invertex)], lookup[frozenset(outvertex)])
                     edge = Edge(invertex, outvertex, None, label)
-                    if not MetagraphHelper().is_edge_in_list(edge, edge_list):
+                    if not MetagraphHelper()._is_edge_in_index(edge, edge_index):
+                        edge_index.setdefault((edge.invertex, edge.outvertex, edge.label), []).append(edge)
                         edge_list.append(edge)
 
             row_index += 1
 
         # combine edges
+        groups = dict()
+        components = dict()
+        for edge in edge_list:
+            groups.setdefault((edge.invertex, edge.outvertex), []).append(edge)
+            components[id(edge)] = MetagraphHelper().extract_edge_label_components(edge.label)
+
         final_edge_list = []
+        final_keys = set()
         for edge1 in edge_list:
-            match = False
-            for edge2 in edge_list:
-                if edge1 != edge2:
-                    if edge1.invertex == edge2.invertex and edge1.outvertex == edge1.outvertex:
-                        match = True
-                        comp1 = MetagraphHelper().extract_edge_label_components(edge1.label)
-                        comp2 = MetagraphHelper().extract_edge_label_components(edge2.label)
-                        combined = (comp1[0].union(comp2[0]), comp1[1].union(comp2[1]), comp1[2].union(comp2[2]))
-                        label = '%s <%s; %s>' % (list(combined[0]), list(combined[1]), list(combined[2]))
-                        combined_edge = Edge(edge1.invertex, edge1.outvertex, None, label)
-                        if not MetagraphHelper().is_edge_in_list(combined_edge, final_edge_list):
-                            final_edge_list.append(combined_edge)
-            if not match:
-                if not MetagraphHelper().is_edge_in_list(edge1, final_edge_list):
-                    final_edge_list.append(edge1)
+            combined_edges = []
+            comp1 = components[id(edge1)]
+            for edge2 in groups[(edge1.invertex, edge1.outvertex)]:
+                if edge2 is not edge1:
+                    comp2 = components[id(edge2)]
+                    combined = (comp1[0].union(comp2[0]), comp1[1].union(comp2[1]), comp1[2].union(comp2[2]))
+                    label = '%s <%s; %s>' % (list(combined[0]), list(combined[1]), list(combined[2]))
+                    combined_edges.append(Edge(edge1.invertex, edge1.outvertex, None, label))
+            for combined_edge in combined_edges or [edge1]:
+                key = (combined_edge.invertex, combined_edge.outvertex, combined_edge.label)
+                if key not in final_keys:
+                    final_keys.add(key)
+                    final_edge_list.append(combined_edge)
 
         if len(final_edge_list) > 0:
             gen_set = MetagraphHelper().get_generating_set(final_edge_list)
@@ -1565,13 +1769,14 @@ class Metagraph(object):
         #adjacency_matrix = self.adjacency_matrix().tolist()
         #all_metapaths1 = []
 
-        from itertools import combinations
-        all_sources1 = sum(map(lambda r: list(combinations(self.generating_set, r)),
-                               range(1, len(self.generating_set))), [])
+        from itertools import chain, combinations
+        # materialised since they are walked once per source below
+        all_sources1 = list(chain.from_iterable(combinations(self.generating_set, r)
+                                                for r in range(1, len(self.generating_set))))
         all_targets1 = copy.copy(all_sources1)
 
-        all_sources2 = sum(map(lambda r: list(combinations(metagraph2.generating_set, r)),
-                               range(1, len(metagraph2.generating_set))), [])
+        all_sources2 = list(chain.from_iterable(combinations(metagraph2.generating_set, r)
+                                                for r in range(1, len(metagraph2.generating_set))))
         all_targets2 = copy.copy(all_sources2)
 
         all_metapaths1 = []
@@ -1611,12 +1816,7 @@ class Metagraph(object):
 
     def __repr__(self):
         edge_desc = [repr(edge) for edge in self.edges]
-        full_desc = ''
-        for desc in edge_desc:
-            if full_desc == '':
-                full_desc = desc
-            else:
-                full_desc += ", " + desc
+        full_desc = ', '.join(edge_desc)
         desc = '%s(%s)' % (str(type(self)), full_desc)
         desc = desc.replace('\\', '')
         return desc
@@ -1640,6 +1840,48 @@ class ConditionalMetagraph(Metagraph):
         self.propositions_set = propositions_set
         self.generating_set = variables_set.union(propositions_set)
         super(ConditionalMetagraph, self).__init__(self.generating_set)
+        # context metagraphs of the interpretations evaluated so far
+        self._context_cache = dict()
+        # action values parsed from each proposition, see edge_attributes_conflict
+        self._action_cache = dict()
+
+    def _invalidate_caches(self):
+        """ Discards the derived caches, the contexts and the metagraph used for metapath queries.
+        :return: None
+        """
+        super(ConditionalMetagraph, self)._invalidate_caches()
+        self._context_cache = dict()
+        self.mg = None
+
+    def _get_cached_context(self, true_propositions, false_propositions):
+        """ Retrieves the context metagraph for the given true and false propositions, reusing earlier ones.
+        The result is shared, so it is only for internal queries that do not modify it.
+        :param true_propositions: list or set
+        :param false_propositions: list or set
+        :return: ConditionalMetagraph object
+        """
+        key = (frozenset(true_propositions), frozenset(false_propositions))
+        if key not in self._context_cache:
+            self._context_cache[key] = self.get_context(true_propositions, false_propositions)
+        return self._context_cache[key]
+
+    def _get_interpretation_context(self, interpretation):
+        """ Retrieves the (shared) context metagraph for a single interpretation.
+        :param interpretation: list of (proposition, boolean) tuples
+        :return: ConditionalMetagraph object
+        """
+        true_propositions = []
+        false_propositions = []
+        for tuple_elt in interpretation:
+            if tuple_elt[0] not in self.propositions_set:
+                raise MetagraphException('interpretations', resources['arguments_invalid'])
+            if tuple_elt[1] and tuple_elt[0] not in true_propositions:
+                true_propositions.append(tuple_elt[0])
+            elif tuple_elt[0] not in true_propositions:
+                false_propositions.append(tuple_elt[0])
+
+        # compute context metagraph
+        return self._get_cached_context(true_propositions, false_propositions)
 
     def add_edges_from(self, edge_list):
         """ Adds the given list of edges to the conditional metagraph.
@@ -1661,14 +1903,9 @@ class ConditionalMetagraph(Metagraph):
                         raise MetagraphException('edge', resources['value_invalid'])
 
         for edge in edge_list:
-            node1 = Node(edge.invertex)
-            node2 = Node(edge.outvertex)
-            if not MetagraphHelper().is_node_in_list(node1, self.nodes):
-                self.nodes.append(node1)
-            if not MetagraphHelper().is_node_in_list(node2, self.nodes):
-                self.nodes.append(node2)
-            if edge not in self.edges:
-                self.edges.append(edge)
+            self._add_node_if_new(Node(edge.invertex))
+            self._add_node_if_new(Node(edge.outvertex))
+            self._add_edge_if_new(edge)
 
     def get_context(self, true_propositions, false_propositions):
         """Retrieves the context metagraph for the given true and false propositions.
@@ -1688,32 +1925,15 @@ class ConditionalMetagraph(Metagraph):
             if proposition not in self.propositions_set:
                 raise MetagraphException('false_propositions', resources['range_invalid'])
 
-        edges_to_remove = []
-        edges_copy = copy.copy(self.edges)
-        for edge in edges_copy:
-            for proposition in list(true_propositions):
-                if proposition in edge.invertex:
-                    edge.invertex.difference({proposition})
-                    # remove if this results in an invertex that is null
-                    if len(edge.invertex) == 0 and edge not in edges_to_remove:
-                        edges_to_remove.append(edge)
-                if proposition in edge.outvertex:
-                    edge.outvertex.difference({proposition})
-                    # remove if this results in an outvertex that is null
-                    if len(edge.outvertex) == 0 and edge not in edges_to_remove:
-                        edges_to_remove.append(edge)
-
-            for proposition in list(false_propositions):
-                if proposition in edge.invertex or proposition in edge.outvertex:
-                    # remove edge
-                    if edge not in edges_to_remove:
-                        edges_to_remove.append(edge)
+        # true propositions are kept on the edges, so their vertices are never emptied;
+        # only edges that depend on a false proposition are removed
+        index, inv_masks, out_masks = self._get_edge_masks()
+        false_mask = self._element_mask(false_propositions, index)
+        edges_copy = [edge for edge, inv_mask, out_mask in zip(self.edges, inv_masks, out_masks)
+                      if not (inv_mask | out_mask) & false_mask]
 
         # create new conditional metagraph describing context
         context = ConditionalMetagraph(self.variables_set, self.propositions_set)
-        for edge in edges_to_remove:
-            if edge in edges_copy:
-                edges_copy.remove(edge)
         context.add_edges_from(edges_copy)
 
         return context
@@ -1727,15 +1947,24 @@ class ConditionalMetagraph(Metagraph):
             raise MetagraphException('variables_subset', resources['value_null'])
 
         subset = variables_subset.union(self.propositions_set)
-        generator_set = self.variables_set.union(self.propositions_set)
-        mg = Metagraph(generator_set)
-        mg.add_edges_from(self.edges)
-        return mg.get_projection(subset)
+        return self._get_metagraph().get_projection(subset)
+
+    def _get_metagraph(self):
+        """ Retrieves the plain metagraph over the variables and propositions, built once and shared
+        by the projection and metapath queries.
+        :return: Metagraph object
+        """
+        if self.mg is None:
+            self.mg = Metagraph(self.variables_set.union(self.propositions_set))
+            self.mg.add_edges_from(self.edges)
+        return self.mg
 
-    def get_all_metapaths_from(self, source, target, prop_subset=None):
+    def get_all_metapaths_from(self, source, target, prop_subset=None, limit=None):
         """ Retrieves all metapaths between given source and target in the conditional metagraph.
         :param source: set
         :param target: set
+        :param prop_subset: set
+        :param limit: int, stop after this many metapaths (all if None)
         :return: list of Metapath objects
         """
 
@@ -1748,55 +1977,45 @@ class ConditionalMetagraph(Metagraph):
         if not target.issubset(self.generating_set):
             raise MetagraphException('subset2', resources['not_a_subset'])
 
-        generator_set = self.variables_set.union(self.propositions_set)
-        if self.mg is None:
-            self.mg = Metagraph(generator_set)
-            self.mg.add_edges_from(self.edges)
         if prop_subset is not None:
-            return self.mg.get_all_metapaths_from(source.union(prop_subset), target)
+            return self._get_metagraph().get_all_metapaths_from(source.union(prop_subset), target, limit)
         else:
-            return self.mg.get_all_metapaths_from(source.union(self.propositions_set), target)
+            return self._get_metagraph().get_all_metapaths_from(source.union(self.propositions_set), target, limit)
 
     def get_all_metapaths(self):
         """ Retrieves all metapaths in the conditional metagraph.
         :return: List of Metapath objects
         """
 
-        from itertools import combinations
-        all_subsets=sum(map(lambda r: list(combinations(self.nodes, r)), range(1, len(self.nodes)+1)), [])
+        from itertools import chain, combinations
+        # materialised since it is walked once per subset below
+        all_subsets = list(chain.from_iterable(combinations(self.nodes, r) for r in range(1, len(self.nodes)+1)))
 
-        all_metapaths = []
-        for subset1 in all_subsets:
-            for subset2 in all_subsets:
-                if subset1 != subset2:
-
-                    if len(subset1)>1:
-                        element_set=set()
-                        for node in subset1:
-                            element_set = element_set.union(node.element_set)
-                        node1 = Node(element_set)
-                    else:
-                        node1=subset1[0]
+        # combine each subset into a single node once, rather than per pair
+        helper = MetagraphHelper()
+        subset_elements = []
+        for subset in all_subsets:
+            if len(subset) > 1:
+                element_set = set()
+                for node in subset:
+                    element_set.update(node.element_set)
+                node = Node(element_set)
+            else:
+                node = subset[0]
+            subset_elements.append(helper.get_element_set([node]))
+        subset_keys = [frozenset(elements) for elements in subset_elements]
 
-                    if len(subset2)>1:
-                        element_set=set()
-                        for node in subset2:
-                            element_set = element_set.union(node.element_set)
-                        node2 = Node(element_set)
-                    else:
-                        node2=subset2[0]
-
-                    # TODO: can source and target in a metapath overlap?
-                    if not MetagraphHelper().nodes_overlap([node1], [node2]):
-                        source = MetagraphHelper().get_element_set([node1])
-                        target = MetagraphHelper().get_element_set([node2])
-                        mps = self.get_all_metapaths_from(source, target)
-                        if mps is None or len(mps) == 0:
-                            continue
-                        # noinspection PyTypeChecker
-                        for mp in mps:
-                            if mp not in all_metapaths:
-                                all_metapaths.append(mp)
+        all_metapaths = []
+        for i, source in enumerate(subset_elements):
+            for j, target in enumerate(subset_elements):
+                # TODO: can source and target in a metapath overlap?
+                if i == j or not subset_keys[i].isdisjoint(subset_keys[j]):
+                    continue
+                mps = self.get_all_metapaths_from(source, target)
+                if mps is None or len(mps) == 0:
+                    continue
+                # each source and target pair yields its own metapaths, so none repeat
+                all_metapaths.extend(mps)
 
         return all_metapaths
 
@@ -1810,11 +2029,11 @@ class ConditionalMetagraph(Metagraph):
         intersec = set()
         edges = metapath.edge_list
         for edge in edges:
-            invertices = invertices.union(edge.invertex)
+            invertices.update(edge.invertex)
             if len(intersec)==0:
                 intersec = set(edge.attributes)
             else:
-                intersec = intersec.intersection(set(edge.attributes))
+                intersec.intersection_update(edge.attributes)
 
         potential_conflicts_set = invertices.intersection(self.propositions_set)
         if self.edge_attributes_conflict(potential_conflicts_set, intersec):
@@ -1845,7 +2064,11 @@ class ConditionalMetagraph(Metagraph):
 
         # currently checks if actions conflict
         # extend later to include active times etc
-        actions = self.get_actions(potential_conflicts_set)
+        actions = set()
+        for attribute in potential_conflicts_set:
+            if attribute not in self._action_cache:
+                self._action_cache[attribute] = self.get_actions([attribute])
+            actions.update(self._action_cache[attribute])
 
         malware_sigs = self.get_malware_sigs(potential_conflicts_set)
         sig_present = self.get_sig_present(potential_conflicts_set)
@@ -1913,6 +2136,16 @@ class ConditionalMetagraph(Metagraph):
                     present.append(value)
         return present
 
+    def _check_logical_expressions(self, logical_expressions):
+        """ Checks that the given logical expressions only refer to propositions of the conditional metagraph.
+        :param logical_expressions: list of strings
+        :return: None
+        """
+        for logical_expression in logical_expressions:
+            for item in _EXPRESSION_DELIMITERS.split(logical_expression):
+                if item != '' and item not in self.propositions_set:
+                    raise MetagraphException('logical_expression', resources['arguments_invalid'])
+
     def is_connected(self, source, target, logical_expressions, interpretations):
         """Checks if subset1 is connected to subset2.
         :param source: set
@@ -1936,34 +2169,12 @@ class ConditionalMetagraph(Metagraph):
             raise MetagraphException('target', resources['not_a_subset'])
 
         # check expressions are over X_p
-        for logical_expression in logical_expressions:
-            logical_expression_copy = copy.copy(logical_expression)
-            logical_expression_copy = logical_expression_copy.replace('.', ' ')
-            logical_expression_copy = logical_expression_copy.replace('|', ' ')
-            logical_expression_copy = logical_expression_copy.replace('!', ' ')
-            logical_expression_copy = logical_expression_copy.replace('(', '')
-            logical_expression_copy.replace(')', '')
-            items = logical_expression_copy.split(' ')
-            for item in items:
-                item = item.replace(' ', '')
-                if item != '' and item not in self.propositions_set:
-                    raise MetagraphException('logical_expression', resources['arguments_invalid'])
+        self._check_logical_expressions(logical_expressions)
 
         # check metapath exists for at least one interpretation
         for interpretation in interpretations:
-            true_propositions = []
-            false_propositions = []
-            for tuple_elt in interpretation:
-                if tuple_elt[0] not in self.propositions_set:
-                    raise MetagraphException('interpretations', resources['arguments_invalid'])
-                if tuple_elt[1] and tuple_elt[0] not in true_propositions:
-                    true_propositions.append(tuple_elt[0])
-                elif tuple_elt[0] not in true_propositions:
-                    false_propositions.append(tuple_elt[0])
-
-            # compute context metagraph
-            context = self.get_context(true_propositions, false_propositions)
-            metapaths = context.get_all_metapaths_from(source, target)
+            context = self._get_interpretation_context(interpretation)
+            metapaths = context.get_all_metapaths_from(source, target, limit=1)
 
             if metapaths is not None and len(metapaths) >= 1:
                 return True
@@ -1993,34 +2204,12 @@ class ConditionalMetagraph(Metagraph):
             raise MetagraphException('target', resources['not_a_subset'])
 
         # check expressions are over X_p
-        for logical_expression in logical_expressions:
-            logical_expression_copy = copy.copy(logical_expression)
-            logical_expression_copy = logical_expression_copy.replace('.', ' ')
-            logical_expression_copy = logical_expression_copy.replace('|', ' ')
-            logical_expression_copy = logical_expression_copy.replace('!', ' ')
-            logical_expression_copy = logical_expression_copy.replace('(', '')
-            logical_expression_copy.replace(')', '')
-            items = logical_expression_copy.split(' ')
-            for item in items:
-                item = item.replace(' ', '')
-                if item != '' and item not in self.propositions_set:
-                    raise MetagraphException('logical_expression', resources['arguments_invalid'])
+        self._check_logical_expressions(logical_expressions)
 
         # check metapath exists for every interpretation
         for interpretation in interpretations:
-            true_propositions = []
-            false_propositions = []
-            for tuple_elt in interpretation:
-                if tuple_elt[0] not in self.propositions_set:
-                    raise MetagraphException('interpretations', resources['arguments_invalid'])
-                if tuple_elt[1] and tuple_elt[0] not in true_propositions:
-                    true_propositions.append(tuple_elt[0])
-                elif tuple_elt[0] not in true_propositions:
-                    false_propositions.append(tuple_elt[0])
-
-            # compute context metagraph
-            context = self.get_context(true_propositions, false_propositions)
-            metapaths = context.get_all_metapaths_from(source, target)
+            context = self._get_interpretation_context(interpretation)
+            metapaths = context.get_all_metapaths_from(source, target, limit=1)
 
             if not(metapaths is not None and len(metapaths) >= 1):
                 return False
@@ -2050,34 +2239,12 @@ class ConditionalMetagraph(Metagraph):
             raise MetagraphException('target', resources['not_a_subset'])
 
         # check expressions are over X_p
-        for logical_expression in logical_expressions:
-            logical_expression_copy = copy.copy(logical_expression)
-            logical_expression_copy = logical_expression_copy.replace('.', ' ')
-            logical_expression_copy = logical_expression_copy.replace('|', ' ')
-            logical_expression_copy = logical_expression_copy.replace('!', ' ')
-            logical_expression_copy = logical_expression_copy.replace('(', '')
-            logical_expression_copy.replace(')', '')
-            items = logical_expression_copy.split(' ')
-            for item in items:
-                item = item.replace(' ', '')
-                if item != '' and item not in self.propositions_set:
-                    raise MetagraphException('logical_expression', resources['arguments_invalid'])
+        self._check_logical_expressions(logical_expressions)
 
         # check metapath exists for every interpretation
         for interpretation in interpretations:
-            true_propositions = []
-            false_propositions = []
-            for tuple_elt in interpretation:
-                if tuple_elt[0] not in self.propositions_set:
-                    raise MetagraphException('interpretations', resources['arguments_invalid'])
-                if tuple_elt[1] and tuple_elt[0] not in true_propositions:
-                    true_propositions.append(tuple_elt[0])
-                elif tuple_elt[0] not in true_propositions:
-                    false_propositions.append(tuple_elt[0])
-
-            # compute context metagraph
-            context = self.get_context(true_propositions, false_propositions)
-            metapaths = context.get_all_metapaths_from(source, target)
+            context = self._get_interpretation_context(interpretation)
+            metapaths = context.get_all_metapaths_from(source, target, limit=2)
 
             if metapaths is not None and len(metapaths) > 1:
                 return False
@@ -2097,52 +2264,25 @@ class ConditionalMetagraph(Metagraph):
             raise MetagraphException('interpretations', resources['value_null'])
 
         # check expressions are over X_p
-        for logical_expression in logical_expressions:
-            logical_expression_copy = copy.copy(logical_expression)
-            logical_expression_copy = logical_expression_copy.replace('.', ' ')
-            logical_expression_copy = logical_expression_copy.replace('|', ' ')
-            logical_expression_copy = logical_expression_copy.replace('!', ' ')
-            logical_expression_copy = logical_expression_copy.replace('(', '')
-            logical_expression_copy.replace(')', '')
-            items = logical_expression_copy.split(' ')
-            for item in items:
-                item = item.replace(' ', '')
-                if item != '' and item not in self.propositions_set:
-                    raise MetagraphException('logical_expression', resources['arguments_invalid'])
+        self._check_logical_expressions(logical_expressions)
 
         # check metapath exists for at least one interpretation
         for interpretation in interpretations:
-            true_propositions = []
-            false_propositions = []
-            for tuple_elt in interpretation:
-                if tuple_elt[0] not in self.propositions_set:
-                    raise MetagraphException('interpretations', resources['arguments_invalid'])
-                if tuple_elt[1] and tuple_elt[0] not in true_propositions:
-                    true_propositions.append(tuple_elt[0])
-                elif tuple_elt[0] not in true_propositions:
-                    false_propositions.append(tuple_elt[0])
-
-            # compute context metagraph
-            context = self.get_context(true_propositions, false_propositions)
-
-            for x in self.variables_set:
-                edge_list = []
-                for edge in context.edges:
-                    if x in edge.outvertex and edge not in edge_list:
-                        edge_list.append(edge)
-                if len(edge_list) > 1:
-                    return False
+            context = self._get_interpretation_context(interpretation)
+
+            # distinct edges producing each variable, in one pass over the edges
+            produced_by = dict()
+            for edge in context.edges:
+                for x in self.variables_set.intersection(edge.outvertex):
+                    produced_by.setdefault(x, set()).add((edge.invertex, edge.outvertex))
+            if any(len(edge_keys) > 1 for edge_keys in produced_by.values()):
+                return False
 
-            return True
+        return True
 
     def __repr__(self):
         edge_desc = [repr(edge) for edge in self.edges]
-        full_desc = ''
-        for desc in edge_desc:
-            if full_desc == '':
-                full_desc = desc
-            else:
-                full_desc += ', ' + desc
+        full_desc = ', '.join(edge_desc)
         desc = '%s(%s)' % (str(type(self)), full_desc)
         desc = desc.replace('\\', '')
         return desc
@@ -2159,11 +2299,11 @@ class MetagraphHelper:
 
     def add_adjacency_matrices(self, adjacency_matrix1, generator_set1, adjacency_matrix2, generator_set2):
         """ Adds the two adjacency matrices provided and returns a combined matrix.
-        :param adjacency_matrix1: numpy.matrix
+        :param adjacency_matrix1: list of lists
         :param generator_set1: set
-        :param adjacency_matrix2: numpy.matrix
+        :param adjacency_matrix2: list of lists
         :param generator_set2: set
-        :return: numpy.matrix
+        :return: list of lists
         """
 
         if adjacency_matrix1 is None:
@@ -2184,20 +2324,10 @@ class MetagraphHelper:
         #combined_adjacency_matrix = None
         if len(generator_set1.difference(generator_set2)) == 0 and len(generator_set2.difference(generator_set1)) == 0:
             # generating sets are identical..use adjacency matrices as is
-            size = len(generator_set1)
-            combined_adjacency_matrix = MetagraphHelper().get_null_matrix(size, size)
-            for i in range(size):
-                for j in range(size):
-                    # take the union
-                    if adjacency_matrix1[i][j] is None:
-                        combined_adjacency_matrix[i][j] = adjacency_matrix2[i][j]
-                    elif adjacency_matrix2[i][j] is None:
-                        combined_adjacency_matrix[i][j] = adjacency_matrix1[i][j]
-                    else:
-                        temp = list()
-                        temp.append(adjacency_matrix1[i][j])
-                        temp.append(adjacency_matrix2[i][j])
-                        combined_adjacency_matrix[i][j] = temp
+            # take the union, cell by cell along paired rows
+            combined_adjacency_matrix = [[cell2 if cell1 is None else cell1 if cell2 is None else [cell1, cell2]
+                                          for cell1, cell2 in zip(row1, row2)]
+                                         for row1, row2 in zip(adjacency_matrix1, adjacency_matrix2)]
 
         else:
             # generating sets overlap but are different...need to redefine adjacency matrices before adding them
@@ -2208,31 +2338,22 @@ class MetagraphHelper:
             edge_list1 = self.get_edges_in_matrix(adjacency_matrix1, generator_set1)
             for edge in edge_list1:
                 mg1.add_edge(edge)
-            modified_adjacency_matrix1 = mg1.adjacency_matrix().tolist()
+            modified_adjacency_matrix1 = mg1.adjacency_matrix()
 
             mg2 = Metagraph(combined_generating_set)
             # add all metagraph2 edges
             edge_list2 = self.get_edges_in_matrix(adjacency_matrix2, generator_set2)
             for edge in edge_list2:
                 mg2.add_edge(edge)
-            modified_adjacency_matrix2 = mg2.adjacency_matrix().tolist()
+            modified_adjacency_matrix2 = mg2.adjacency_matrix()
 
             #combined_mg = Metagraph(combined_generating_set)
-            size = len(combined_generating_set)
-            combined_adjacency_matrix = MetagraphHelper().get_null_matrix(size, size)
-            for i in range(size):
-                for j in range(size):
-                    # take the union
-                    if modified_adjacency_matrix1[i][j] is None:
-                        combined_adjacency_matrix[i][j] = modified_adjacency_matrix2[i][j]
-                    elif modified_adjacency_matrix2[i][j] is None:
-                        combined_adjacency_matrix[i][j] = modified_adjacency_matrix1[i][j]
-                    else:
-                        temp = modified_adjacency_matrix1[i][j]
-                        for triple in modified_adjacency_matrix2[i][j]:
-                            if not triple in modified_adjacency_matrix1[i][j]:
-                                temp.append(triple)
-                        combined_adjacency_matrix[i][j] = temp
+            # take the union, cell by cell along paired rows
+            combined_adjacency_matrix = [[cell2 if cell1 is None else cell1 if cell2 is None else
+                                          cell1 + [triple for triple in cell2 if triple not in cell1]
+                                          for cell1, cell2 in zip(row1, row2)]
+                                         for row1, row2 in zip(modified_adjacency_matrix1,
+                                                               modified_adjacency_matrix2)]
 
         return combined_adjacency_matrix
 
@@ -2272,13 +2393,15 @@ class MetagraphHelper:
 
         return Metapath(source,target,edges)
 
-    def multiply_adjacency_matrices(self, adjacency_matrix1, generator_set1, adjacency_matrix2, generator_set2):
+    def multiply_adjacency_matrices(self, adjacency_matrix1, generator_set1, adjacency_matrix2, generator_set2,
+                                    reachable=None):
         """ Multiplies the two adjacency matrices provided and returns the result.
-        :param adjacency_matrix1: numpy.matrix
+        :param adjacency_matrix1: list of lists
         :param generator_set1: set
-        :param adjacency_matrix2: numpy.matrix
+        :param adjacency_matrix2: list of lists
         :param generator_set2: set
-        :return: numpy.matrix
+        :param reachable: optional list of int row bitmasks, cells with a clear bit are known to be empty
+        :return: list of lists
         """
 
         if adjacency_matrix1 is None:
@@ -2298,62 +2421,85 @@ class MetagraphHelper:
 
         size = len(generator_set1)
         resultant_adjacency_matrix = MetagraphHelper().get_null_matrix(size, size)
+        # element order of the matrix rows/cols, listed once rather than per cell
+        elements = list(generator_set1)
 
         for i in range(size):
+            # only the non-empty cells of row i can contribute to row i of the product
+            row_ks = [k for k in range(size) if adjacency_matrix1[i][k] is not None]
+            if len(row_ks) == 0:
+                continue
             for j in range(size):
+                if reachable is not None and not (reachable[i] >> j) & 1:
+                    continue
                 resultant_adjacency_matrix[i][j] = self.multiply_components(adjacency_matrix1,
                                                                             adjacency_matrix2,
-                                                                            generator_set1, i,
-                                                                            j, size)
+                                                                            elements, i,
+                                                                            j, size, row_ks)
                 #print('multiply_components')
 
         return resultant_adjacency_matrix
 
-    def multiply_components(self, adjacency_matrix1, adjacency_matrix2, generator_set1, i, j, size):
-        """ Multiplies elements of two adjacency matrices.
-        :param adjacency_matrix1: numpy.matrix
-        :param adjacency_matrix2: numpy.matrix
-        :param generator_set1: set
-        :param i: int
-        :param j: int
-        :param size: int
-        :return: list of Triple objects.
-        """
-
-        if adjacency_matrix1 is None:
-            raise MetagraphException('adjacency_matrix1', resources['value_null'])
-        if adjacency_matrix2 is None:
-            raise MetagraphException('adjacency_matrix2', resources['value_null'])
-        if generator_set1 is None or len(generator_set1) == 0:
-            raise MetagraphException('generator_set1', resources['value_null'])
-
+    @staticmethod
+    def get_row_masks(adjacency_matrix):
+        """ Returns one bitmask per row of an adjacency matrix, bit j is set iff cell j is non-empty.
+        :param adjacency_matrix: list of lists
+        :return: list of int
+        """
+        rows = []
+        for row in adjacency_matrix:
+            bits = 0
+            for j, cell in enumerate(row):
+                if cell is not None:
+                    bits |= 1 << j
+            rows.append(bits)
+        return rows
+
+    def get_product_support(self, adjacency_matrix1, adjacency_matrix2):
+        """ Returns row bitmasks of the cells that can be non-empty in the product of two adjacency matrices.
+        :param adjacency_matrix1: list of lists
+        :param adjacency_matrix2: list of lists
+        :return: list of int
+        """
+        rows2 = self.get_row_masks(adjacency_matrix2)
         result = []
-        # computes the outermost loop (ie., k=1...K where K is the size of each input matrix)
-        for k in range(size):
-            a_ik = adjacency_matrix1[i][k]
-            b_kj = adjacency_matrix2[k][j]
-            #print('multiply_triple_lists')
-            temp = self.multiply_triple_lists(a_ik, b_kj, list(generator_set1)[i],
-                                              list(generator_set1)[j], list(generator_set1)[k])
-            if temp is not None:
-                #print('len(temp): %s'%len(temp))
-                for triple in temp:
-                    if not MetagraphHelper().is_triple_in_list(triple, result):
-                        result.append(triple)
-                    #if triple not in result: result.append(triple)
-        if len(result) == 0:
-            return None
-
+        for bits in self.get_row_masks(adjacency_matrix1):
+            # boolean product, OR together the rows of matrix2 selected by the bits of this row
+            support = 0
+            k = 0
+            while bits:
+                if bits & 1:
+                    support |= rows2[k]
+                bits >>= 1
+                k += 1
+            result.append(support)
         return result
 
-    def multiply_components(self, adjacency_matrix1, adjacency_matrix2, generator_set1, i, j, size):
+    def get_reachability(self, adjacency_matrix):
+        """ Returns the transitive closure of the non-empty cells of an adjacency matrix as row bitmasks.
+        :param adjacency_matrix: list of lists
+        :return: list of int
+        """
+        rows = self.get_row_masks(adjacency_matrix)
+
+        # Warshall, a row that reaches k also reaches everything k reaches
+        for k in range(len(rows)):
+            mask = 1 << k
+            row_k = rows[k]
+            for i in range(len(rows)):
+                if rows[i] & mask:
+                    rows[i] |= row_k
+        return rows
+
+    def multiply_components(self, adjacency_matrix1, adjacency_matrix2, generator_set1, i, j, size, ks=None):
         """ Multiplies elements of two adjacency matrices.
-        :param adjacency_matrix1: numpy.matrix
-        :param adjacency_matrix2: numpy.matrix
-        :param generator_set1: set
+        :param adjacency_matrix1: list of lists
+        :param adjacency_matrix2: list of lists
+        :param generator_set1: set, or list giving the element order
         :param i: int
         :param j: int
         :param size: int
+        :param ks: optional list of int, the only k for which row i of adjacency_matrix1 is non-empty
         :return: list of Triple objects.
         """
 
@@ -2364,13 +2510,13 @@ class MetagraphHelper:
         if generator_set1 is None or len(generator_set1) == 0:
             raise MetagraphException('generator_set1', resources['value_null'])
 
+        elements = generator_set1 if isinstance(generator_set1, list) else list(generator_set1)
         result = []
         # computes the outermost loop (ie., k=1...K where K is the size of each input matrix)
-        for k in range(size):
+        for k in (range(size) if ks is None else ks):
             a_ik = adjacency_matrix1[i][k]
             b_kj = adjacency_matrix2[k][j]
-            temp = self.multiply_triple_lists(a_ik, b_kj, list(generator_set1)[i],
-                                              list(generator_set1)[j], list(generator_set1)[k])
+            temp = self.multiply_triple_lists(a_ik, b_kj, elements[i], elements[j], elements[k])
 
             if temp is not None and len(temp)>0:
                 result+=temp
@@ -2378,7 +2524,14 @@ class MetagraphHelper:
         if len(result) == 0:
             return None
 
-        return list(set(result))
+        # drop repeated triples, keeping the first of each
+        seen = set()
+        unique = []
+        for triple in result:
+            if triple not in seen:
+                seen.add(triple)
+                unique.append(triple)
+        return unique
 
     def multiply_triple_lists(self, triple_list1, triple_list2, x_i, x_j, x_k):
         """ Multiplies two list of Triple objects and returns the result.
@@ -2421,46 +2574,33 @@ class MetagraphHelper:
         if triple1 is None or triple2 is None:
             return None
 
-        # compute alpha(R)
-        alpha_r = triple2.coinputs
-        if triple2.coinputs is None:
-            alpha_r = triple1.coinputs
-        elif triple1.coinputs is not None:
-            alpha_r = triple1.coinputs.union(triple2.coinputs)
-        if alpha_r is not None and triple1.cooutputs is not None:
-            alpha_r = alpha_r.difference(({x_i}).union(triple1.cooutputs))
-        elif alpha_r is not None:
-            alpha_r = alpha_r.difference(({x_i}))
+        # missing co-inputs/co-outputs act as empty sets
+        empty = frozenset()
+        coinputs1 = empty if triple1.coinputs is None else triple1.coinputs
+        coinputs2 = empty if triple2.coinputs is None else triple2.coinputs
+        cooutputs1 = empty if triple1.cooutputs is None else triple1.cooutputs
+        cooutputs2 = empty if triple2.cooutputs is None else triple2.cooutputs
 
-        # compute beta(R)
-        beta_r = triple2.cooutputs
-        if triple2.cooutputs is None:
-            beta_r = triple1.cooutputs
-        elif triple1.cooutputs is not None:
-            beta_r = triple1.cooutputs.union(triple2.cooutputs)
-        if beta_r is not None:
-            beta_r = beta_r.union({x_k})
-            beta_r = beta_r.difference({x_j})
-        else:
-            beta_r = {x_k}
-            beta_r = beta_r.difference(({x_j}))
-
-        # compute gamma(R)
-        truncated = []
-        if triple1.edges not in truncated:
-            if isinstance(triple1.edges, Edge):
-                truncated.append(triple1.edges)
-            else:
-                if isinstance(triple1.edges, list):
-                    truncated = copy.copy(triple1.edges)
+        # compute alpha(R), undefined when neither triple has co-inputs
+        alpha_r = None
+        if triple1.coinputs is not None or triple2.coinputs is not None:
+            alpha_r = (coinputs1 | coinputs2) - ({x_i} | cooutputs1)
 
-        if triple2.edges not in truncated:
-            if isinstance(triple2.edges, Edge):
-                truncated.append(triple2.edges)
-            else:
-                truncated.append = copy.copy(triple2.edges)
+        # compute beta(R)
+        beta_r = (cooutputs1 | cooutputs2 | {x_k}) - {x_j}
 
-        gamma_r = truncated
+        # compute gamma(R), the edges of triple1 followed by the new edges of triple2
+        if isinstance(triple1.edges, Edge):
+            gamma_r = [triple1.edges]
+        elif isinstance(triple1.edges, list):
+            gamma_r = copy.copy(triple1.edges)
+        else:
+            gamma_r = []
+        present = set(edge for edge in gamma_r if isinstance(edge, Edge))
+        for edge in (triple2.edges if isinstance(triple2.edges, list) else [triple2.edges]):
+            if edge not in present:
+                present.add(edge)
+                gamma_r.append(edge)
 
         return Triple(alpha_r, beta_r, gamma_r)
 
@@ -2472,17 +2612,13 @@ class MetagraphHelper:
         :return: list
         """
         psi = None
-        result = []
-        for i in range(rows):
-            # noinspection PyUnusedLocal
-            item = [psi for j in range(cols)]
-            result.append(item)
-        return result
+        # one allocation per row; None is shared, so repeating it is safe
+        return [[psi] * cols for _ in range(rows)]
 
     @staticmethod
     def get_edges_in_matrix(adjacency_matrix, generator_set):
         """ Returns the list of edges in the provided adjacency matrix.
-        :param adjacency_matrix: numpy.matrix
+        :param adjacency_matrix: list of lists
         :param generator_set: set
         :return: list of Edge objects
         """
@@ -2492,17 +2628,18 @@ class MetagraphHelper:
         if generator_set is None or len(generator_set) == 0:
             raise MetagraphException('generator_set', resources['value_null'])
 
-        size = len(generator_set)
         edge_list = []
-        for i in range(size):
-            for j in range(size):
-                if adjacency_matrix[i][j] is not None:
-                    # list of triples
-                    triples_list = adjacency_matrix[i][j]
-                    for triple in triples_list:
-                        # gamma_R describes the edge
-                        if triple[2] not in edge_list:
-                            edge_list.append(triple[2])
+        seen = set()
+        for row in adjacency_matrix:
+            for triples_list in row:
+                if triples_list is None:
+                    continue
+                for triple in triples_list:
+                    # gamma_R describes the edges
+                    for edge in MetagraphHelper()._iter_edges(triple.edges):
+                        if edge not in seen:
+                            seen.add(edge)
+                            edge_list.append(edge)
 
         return edge_list
 
@@ -2516,15 +2653,11 @@ class MetagraphHelper:
         if nested_edges is None or len(nested_edges) == 0:
             return edge_list
 
-        for element in nested_edges:
-            if isinstance(element, list):
-                temp = self.get_edge_list(element)
-                for edge in temp:
-                    if edge not in edge_list:
-                        edge_list.append(edge)
-            elif isinstance(element, Edge):
-                if element not in edge_list:
-                    edge_list.append(element)
+        seen = set()
+        for edge in self._iter_edges(nested_edges):
+            if edge not in seen:
+                seen.add(edge)
+                edge_list.append(edge)
 
         return edge_list
 
@@ -2534,9 +2667,21 @@ class MetagraphHelper:
         :param target_edge_list: a list of target edges
         :return: a list of Edge objects.
         """
+        # bucket the (possibly nested) edges to remove by their vertices,
+        # only edges in the same bucket need the full comparison
+        buckets = dict()
+        pending = [edges_to_remove]
+        while pending:
+            element = pending.pop()
+            if isinstance(element, list):
+                pending.extend(element)
+            elif isinstance(element, Edge):
+                buckets.setdefault((element.invertex, element.outvertex), []).append(element)
+
         updated = []
         for edge in target_edge_list:
-            if not self.is_edge_in_list(edge, edges_to_remove):
+            candidates = buckets.get((edge.invertex, edge.outvertex), [])
+            if not any(self.are_edges_equal(edge, candidate) for candidate in candidates):
                 updated.append(edge)
 
         return updated
@@ -2555,21 +2700,78 @@ class MetagraphHelper:
             return nested_triples.edges
 
         elif isinstance(nested_triples, list):
-            for element in nested_triples:
-                temp = self.get_edges_from_triple_list(element)
-                if isinstance(temp, list):
-                    for elt in temp:
-                        if isinstance(elt, Edge) and (elt not in result):
-                            result.append(elt)
-                        elif isinstance(elt, list):
-                            for elt2 in elt:
-                                if elt2 not in result:
-                                    result.append(elt2)
-                elif isinstance(temp, Edge) and (temp not in result):
-                    result.append(temp)
+            seen = set()
+            for triple in self._iter_triples(nested_triples):
+                edges = triple.edges if isinstance(triple.edges, list) else [triple.edges]
+                for elt in edges:
+                    # edges nested one level down are taken as they are
+                    for edge in (elt if isinstance(elt, list) else [elt]):
+                        if isinstance(edge, Edge) and edge not in seen:
+                            seen.add(edge)
+                            result.append(edge)
 
         return result
 
+    @staticmethod
+    def _iter_triples(nested_triples):
+        """ Yields the Triple objects of a nested list of triples, depth first and in order.
+        :param nested_triples: nested list of Triple objects
+        :return: generator of Triple objects
+        """
+        stack = [nested_triples]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, list):
+                stack.extend(reversed(element))
+            elif isinstance(element, Triple):
+                yield element
+
+    @staticmethod
+    def _iter_edges(nested_edges):
+        """ Yields the Edge objects of a nested list of edges, depth first and in order.
+        :param nested_edges: Edge object or nested list of Edge objects
+        :return: generator of Edge objects
+        """
+        stack = [nested_edges]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, list):
+                stack.extend(reversed(element))
+            elif isinstance(element, Edge):
+                yield element
+
+    def _index_edges(self, nested_edges):
+        """ Buckets the edges of a nested list by (invertex, outvertex, label), the fields that
+        are_edges_equal always compares, so membership only checks edges in one bucket.
+        :param nested_edges: Edge object or nested list of Edge objects
+        :return: dict
+        """
+        index = dict()
+        for edge in self._iter_edges(nested_edges):
+            index.setdefault((edge.invertex, edge.outvertex, edge.label), []).append(edge)
+        return index
+
+    def _is_edge_in_index(self, edge, index):
+        """ Checks whether an edge equals one of the edges bucketed by _index_edges.
+        :param edge: Edge object
+        :param index: dict
+        :return: boolean
+        """
+        for element in index.get((edge.invertex, edge.outvertex, edge.label), ()):
+            if self.are_edges_equal(edge, element):
+                return True
+        return False
+
+    @staticmethod
+    def _triple_key(triple):
+        """ Returns the hashable fields that are_triples_equal requires to match exactly.
+        :param triple: Triple object
+        :return: tuple
+        """
+        return (None if triple.coinputs is None else frozenset(triple.coinputs),
+                None if triple.cooutputs is None else frozenset(triple.cooutputs),
+                len(triple.edges) if isinstance(triple.edges, list) else 1)
+
     def is_triple_in_list(self, triple, triples_list):
         """ Checks whether a particular Triple object is in a given list of Triples.
         :param triple: Triple object
@@ -2602,19 +2804,12 @@ class MetagraphHelper:
             raise MetagraphException('edge', resources['value_null'])
         if nested_edges is None:
             raise MetagraphException('nested_edges', resources['value_null'])
-        result = False
-
-        if isinstance(nested_edges, list):
-            for element in nested_edges:
-                result = self.is_edge_in_list(edge, element)
-                if result:
-                    break
 
-        elif isinstance(nested_edges, Edge):
-            if self.are_edges_equal(edge, nested_edges):
-                result = True
+        for element in self._iter_edges(nested_edges):
+            if self.are_edges_equal(edge, element):
+                return True
 
-        return result
+        return False
 
     def is_node_in_list(self, node, node_list):
         """ Checks if a particular node is in the given list of nodes.
@@ -2627,19 +2822,17 @@ class MetagraphHelper:
             raise MetagraphException('node', resources['value_null'])
         if node_list is None:
             raise MetagraphException('node_list', resources['value_null'])
-        result = False
 
-        if isinstance(node_list, list):
-            for element in node_list:
-                result = self.is_node_in_list(node, element)
-                if result:
-                    break
-
-        elif isinstance(node_list, Node):
-            if self.are_nodes_equal(node, node_list):
-                result = True
+        stack = [node_list]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, list):
+                stack.extend(reversed(element))
+            elif isinstance(element, Node):
+                if self.are_nodes_equal(node, element):
+                    return True
 
-        return result
+        return False
 
     def are_triples_equal(self, triple1, triple2):
         """ Checks if the two given triples are equal.
@@ -2657,21 +2850,25 @@ class MetagraphHelper:
         if not isinstance(triple2, Triple):
             raise MetagraphException('triple2', resources['format_invalid'])
 
-        edge_list_match = True
-        for edge in triple1.edges:
-            if not self.is_edge_in_list(edge, triple2.edges):
-                edge_list_match = False
-                break
+        # a single edge counts as a list of one
+        edges1 = triple1.edges if isinstance(triple1.edges, list) else [triple1.edges]
+        edges2 = triple2.edges if isinstance(triple2.edges, list) else [triple2.edges]
+        if not (triple1.coinputs == triple2.coinputs and
+                triple1.cooutputs == triple2.cooutputs and
+                len(edges1) == len(edges2)):
+            return False
 
-        for edge in triple2.edges:
-            if not self.is_edge_in_list(edge, triple1.edges):
-                edge_list_match = False
-                break
+        # each edge list must include the other
+        index1 = self._index_edges(edges1)
+        index2 = self._index_edges(edges2)
+        for edge in edges1:
+            if not self._is_edge_in_index(edge, index2):
+                return False
+        for edge in edges2:
+            if not self._is_edge_in_index(edge, index1):
+                return False
 
-        return (triple1.coinputs == triple2.coinputs and
-                triple1.cooutputs == triple2.cooutputs and
-                len(triple1.edges) == len(triple2.edges) and
-                edge_list_match)
+        return True
 
     @staticmethod
     def are_edges_equal(edge1, edge2):
@@ -2690,15 +2887,14 @@ class MetagraphHelper:
         if not isinstance(edge2, Edge):
             raise MetagraphException('edge2', resources['format_invalid'])
 
+        if not (edge1.invertex == edge2.invertex and
+                edge1.outvertex == edge2.outvertex and
+                edge1.label == edge2.label):
+            return False
+        # attributes only count when both edges have them
         if edge1.attributes is not None and edge2.attributes is not None:
-            return (edge1.invertex == edge2.invertex and
-                    edge1.outvertex == edge2.outvertex and
-                    set(edge1.attributes) == set(edge2.attributes) and
-                    edge1.label == edge2.label)
-        else:
-            return (edge1.invertex == edge2.invertex and
-                    edge1.outvertex == edge2.outvertex and
-                    edge1.label == edge2.label)
+            return edge1.attribute_set == edge2.attribute_set
+        return True
 
     @staticmethod
     def are_nodes_equal(node1, node2):
@@ -2733,18 +2929,16 @@ class MetagraphHelper:
             raise MetagraphException('reference_edge_list', resources['value_null'])
 
         for ref_edges in reference_edge_list:
+            # only a reference list of the same length can match, skip the others unindexed
+            if len(edges) != len(ref_edges):
+                continue
+            ref_index = MetagraphHelper()._index_edges(ref_edges)
             inclusive_list = True
             for edge1 in edges:
-                if not MetagraphHelper().is_edge_in_list(edge1, ref_edges):
-                #match=False
-                #for edge2 in ref_edges:
-                #    if edge1.invertex==edge2.invertex and edge1.outvertex==edge2.outvertex:
-                #        match=True
-                #        break
-                #if not match:
+                if not MetagraphHelper()._is_edge_in_index(edge1, ref_index):
                     inclusive_list = False
                     break
-            if inclusive_list and len(edges) == len(ref_edges):
+            if inclusive_list:
                 return True
 
         return False
@@ -2774,16 +2968,19 @@ class MetagraphHelper:
             raise MetagraphException('edge_list', resources['value_null'])
 
         all_inputs = []
-        for edge in edge_list:
-            if isinstance(edge, Edge):
-                for input_elt in edge.invertex:
-                    if input_elt not in all_inputs:
+        seen = set()
+        stack = [edge_list]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, Edge):
+                for input_elt in element.invertex:
+                    if input_elt not in seen:
+                        seen.add(input_elt)
                         all_inputs.append(input_elt)
-            elif isinstance(edge, list):
-                temp = self.get_netinputs(edge)
-                for item in temp:
-                    if item not in all_inputs:
-                        all_inputs.append(item)
+            elif isinstance(element, list):
+                if len(element) == 0:
+                    raise MetagraphException('edge_list', resources['value_null'])
+                stack.extend(reversed(element))
 
         return all_inputs
 
@@ -2797,16 +2994,19 @@ class MetagraphHelper:
             raise MetagraphException('edge_list', resources['value_null'])
 
         all_outputs = []
-        for edge in edge_list:
-            if isinstance(edge, Edge):
-                for output in edge.outvertex:
-                    if output not in all_outputs:
+        seen = set()
+        stack = [edge_list]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, Edge):
+                for output in element.outvertex:
+                    if output not in seen:
+                        seen.add(output)
                         all_outputs.append(output)
-            elif isinstance(edge, list):
-                temp = self.get_netoutputs(edge)
-                for item in temp:
-                    if item not in all_outputs:
-                        all_outputs.append(item)
+            elif isinstance(element, list):
+                if len(element) == 0:
+                    raise MetagraphException('edge_list', resources['value_null'])
+                stack.extend(reversed(element))
 
         return all_outputs
 
@@ -2821,10 +3021,12 @@ class MetagraphHelper:
             raise MetagraphException('triples_list', resources['value_null'])
 
         all_coinputs = []
+        seen = set()
         for triple in triples_list:
             if triple.coinputs is not None:
                 for coinput in triple.coinputs:
-                    if coinput not in all_coinputs:
+                    if coinput not in seen:
+                        seen.add(coinput)
                         all_coinputs.append(coinput)
 
         return all_coinputs
@@ -2840,10 +3042,12 @@ class MetagraphHelper:
             raise MetagraphException('triples_list', resources['value_null'])
 
         all_cooutputs = []
+        seen = set()
         for triple in triples_list:
             if triple.cooutputs is not None:
                 for cooutput in triple.cooutputs:
-                    if cooutput not in all_cooutputs:
+                    if cooutput not in seen:
+                        seen.add(cooutput)
                         all_cooutputs.append(cooutput)
 
         return all_cooutputs
@@ -2858,11 +3062,14 @@ class MetagraphHelper:
             raise MetagraphException('nested_edge_list', resources['value_null'])
         result = []
 
-        for element in nested_edge_list:
+        stack = [nested_edge_list]
+        while stack:
+            element = stack.pop()
             if isinstance(element, list):
-                temp = self.extract_edge_list(element)
-                for item in temp:
-                    result.append(item)
+                # nested lists must not be empty either
+                if len(element) == 0:
+                    raise MetagraphException('nested_edge_list', resources['value_null'])
+                stack.extend(reversed(element))
 
             elif isinstance(element, Edge):
                 result.append(element)
@@ -2876,8 +3083,25 @@ class MetagraphHelper:
         :return: boolean
         """
 
+        if nodes_list2 is None:
+            raise MetagraphException('node_list', resources['value_null'])
+
+        # element sets of the nodes in the (nested) second list, compared as are_nodes_equal does
+        keys = set()
+        stack = [nodes_list2]
+        while stack:
+            element = stack.pop()
+            if isinstance(element, list):
+                stack.extend(element)
+            elif isinstance(element, Node):
+                keys.add(frozenset(element.element_set))
+
         for node1 in nodes_list1:
-            if self.is_node_in_list(node1, nodes_list2):
+            if node1 is None:
+                raise MetagraphException('node', resources['value_null'])
+            if not isinstance(node1, Node):
+                raise MetagraphException('node1', resources['format_invalid'])
+            if frozenset(node1.element_set) in keys:
                 return True
 
         return False
@@ -2885,6 +3109,8 @@ class MetagraphHelper:
     def generate_visualisation(self, edge_list, file_path):
         try:
             clusters = dict()
+            # cluster content -> cluster index
+            cluster_ids = dict()
             edges = []
             index = 0
             for edge in edge_list:
@@ -2892,14 +3118,15 @@ class MetagraphHelper:
                 outv=None
                 if len(list(edge.invertex))>1:
                     # is a cluster
-                    if edge.invertex not in clusters.values():
+                    if edge.invertex not in cluster_ids:
                         # create new
                         clusters[index] = edge.invertex
+                        cluster_ids[edge.invertex] = index
                         inv = index
                         index+=1
                     else:
                         # use existing
-                        inv = clusters.values().index(edge.invertex)
+                        inv = cluster_ids[edge.invertex]
 
                 else:
                     # indiv node
@@ -2912,14 +3139,15 @@ class MetagraphHelper:
 
                 if len(list(edge.outvertex))>1:
                     # a cluster
-                    if edge.outvertex not in clusters.values():
+                    if edge.outvertex not in cluster_ids:
                         # create new
                         clusters[index] = edge.outvertex
+                        cluster_ids[edge.outvertex] = index
                         outv=index
                         index+=1
                     else:
                         # use existing
-                        outv = clusters.values().index(edge.outvertex)
+                        outv = cluster_ids[edge.outvertex]
 
                 else:
                     # indiv node
@@ -2938,7 +3166,7 @@ class MetagraphHelper:
             dot_output.append('compound=true; \n')
 
             # clusters first
-            for index, content in clusters.iteritems():
+            for index, content in clusters.items():
                 dot_output.append('subgraph cluster%s { \n'%index)
                 for elt in list(content):
                     #if '2202' in elt:
@@ -2968,13 +3196,13 @@ class MetagraphHelper:
 
                 if isinstance(edge[1],int):
                     # outvertex is a cluster
-                    outv_cluster='cluster%s'%edge[0]
+                    outv_cluster='cluster%s'%edge[1]
                     outv = clusters[edge[1]]
                 else:
                     # outvertex is an individual node
                     outv = edge[1]
 
-                if isinstance(inv,set) and isinstance(outv,set):
+                if isinstance(inv,(set,frozenset)) and isinstance(outv,(set,frozenset)):
                     # inv, outv both clusters
                     a = list(inv)[0]
                     b = list(outv)[0]
@@ -2989,7 +3217,7 @@ class MetagraphHelper:
                     b = b.replace('"','')
                     b = b.replace(';','')
                     dot_output.append('%s -> %s [ltail=%s,lhead=%s]; \n'%(a,b,inv_cluster,outv_cluster))
-                elif isinstance(inv,set) and isinstance(outv,str):
+                elif isinstance(inv,(set,frozenset)) and isinstance(outv,str):
                     # inv is cluster, outv is string
                     a = list(inv)[0]
                     a = a.strip()
@@ -2998,7 +3226,7 @@ class MetagraphHelper:
                     a = a.replace('"','')
                     a = a.replace(';','')
                     dot_output.append('%s -> %s [ltail=%s]; \n'%(a,outv,inv_cluster))
-                elif isinstance(inv,str) and isinstance(outv,set):
+                elif isinstance(inv,str) and isinstance(outv,(set,frozenset)):
                     # inv is string, outv is cluster
                     b = list(outv)[0]
                     b = b.strip()
@@ -3022,7 +3250,7 @@ class MetagraphHelper:
             dot_file.write(dot_file_text)
             dot_file.close()
 
-        except BaseException, e:
+        except BaseException as e:
             print('generate_visualisation:: Error- %s'%e)
 
 
@@ -3035,11 +3263,13 @@ class MetagraphHelper:
         :return: boolean
         """
 
+        # some pair of nodes shares an element iff the element unions of the two lists do
+        elements1 = set()
         for node1 in nodes_list1:
-            for node2 in nodes_list2:
-                intersection = node1.get_element_set().intersection(node2.get_element_set())
-                if intersection is not None and len(intersection) > 0:
-                    return True
+            elements1.update(node1.get_element_set())
+        for node2 in nodes_list2:
+            if not elements1.isdisjoint(node2.get_element_set()):
+                return True
 
         return False
 
@@ -3053,17 +3283,12 @@ class MetagraphHelper:
         if edge_list is None or len(edge_list) == 0:
             raise MetagraphException('edge_list', resources['value_null'])
 
-        generating_set = []
+        generating_set = set()
         for edge in edge_list:
-            for input_elt in edge.invertex:
-                if input_elt not in generating_set:
-                    generating_set.append(input_elt)
-
-            for output in edge.outvertex:
-                if output not in generating_set:
-                    generating_set.append(output)
+            generating_set.update(edge.invertex)
+            generating_set.update(edge.outvertex)
 
-        return set(generating_set)
+        return generating_set
 
     @staticmethod
     def get_element_set(nodes_list):
@@ -3074,7 +3299,7 @@ class MetagraphHelper:
         if nodes_list is not None and len(nodes_list) > 0:
             result = set()
             for node in nodes_list:
-                result = result.union(node.get_element_set())
+                result.update(node.get_element_set())
 
             return result
 
@@ -3090,16 +3315,12 @@ class MetagraphHelper:
         if matrix is None:
             raise MetagraphException('matrix', resources['value_null'])
 
-        #rows = len(matrix)
-        cols = len(matrix[0])
+        from numpy import ndarray
+        if isinstance(matrix, ndarray):
+            # numpy arrays transpose as a view
+            return matrix.T
 
-        result = []
-
-        for j in range(cols):
-            column = [row[j] for row in matrix]
-            result.append(column)
-
-        return result
+        return [list(column) for column in zip(*matrix)]
 
     @staticmethod
     def custom_multiply_matrices(matrix1, matrix2, edge_list):
@@ -3122,18 +3343,32 @@ class MetagraphHelper:
         if matrix1_cols != matrix2_rows:
             raise MetagraphException('matrix1, matrix2', resources['structures_incompatible'])
 
-        result = MetagraphHelper().get_null_matrix(len(matrix1), len(matrix2[0]))
+        rows = len(matrix1)
+        cols = len(matrix2[0])
+        if rows > 0 and cols > 0 and len(edge_list) < matrix1_cols:
+            raise MetagraphException('k', resources['value_out_of_bounds'])
+
+        result = [[set() for _ in range(cols)] for _ in range(rows)]
 
-        for i in range(len(matrix1)):
-            for j in range(len(matrix2[0])):
-                intermediate_result = set()
-                for k in range(len(matrix1[0])):
-                    a_ik = matrix1[i][k]
-                    b_kj = matrix2[k][j]
-                    temp = MetagraphHelper().custom_add_matrix_elements(k, a_ik, b_kj, edge_list)
-                    intermediate_result = intermediate_result.union(temp)
+        # custom_add_matrix_elements inlined: only a_ik of 1 or -1 paired with b_kj of -1
+        # contribute, so list the -1 columns of each row of matrix2 once
+        minus_cols = [[j for j in range(cols) if matrix2[k][j] == -1] for k in range(matrix1_cols)]
 
-                result[i][j] = intermediate_result
+        for i in range(rows):
+            row_i = matrix1[i]
+            result_i = result[i]
+            for k in range(matrix1_cols):
+                if not minus_cols[k]:
+                    continue
+                a_ik = row_i[k]
+                if a_ik == 1:
+                    element = (1, edge_list[k])
+                elif a_ik == -1:
+                    element = (-1, edge_list[k])
+                else:
+                    continue
+                for j in minus_cols[k]:
+                    result_i[j].add(element)
 
         return result
 
@@ -3167,21 +3402,10 @@ class MetagraphHelper:
         if label is None or label == '':
             raise MetagraphException('label', resources['value_null'])
 
-        label = label.replace('>', '')
-        items = label.split('<')
-        if len(items) < 2:
-            raise MetagraphException('label', resources['format_invalid'])
-
-        r_ij = {items[0]}
-        tuples = items[1].split(';')
-        if len(tuples) < 2:
-            raise MetagraphException('label', resources['format_invalid'])
-
-        t_a = {tuples[0]}
-        t_b = {tuples[1]}
-
+        r_ij, a, b = _split_edge_label(label)
+        # fresh sets each call, the parsed strings are shared
         # noinspection PyRedundantParentheses
-        return (r_ij, t_a, t_b)
+        return ({r_ij}, {a}, {b})
 
     @staticmethod
     def get_pre_requisites_list(pre_requisites_desc):
@@ -1,36 +1,24 @@
 """
 mgtoolkit: metagraph implementation tool
 
-Note that "python setup.py test" invokes pytest on the package. With appropriately
-configured setup.cfg, this will check both xxx_test modules and docstrings.
-
 Copyright 2017, dinesha ranathunga.
 Licensed under MIT.
 """
 # -*- coding: utf-8 -*-
 
+import re
 import sys
 from setuptools import setup, find_packages
-from setuptools.command.test import test as test_command
 
-if sys.version_info[:2] != (2, 7):
-    print("mgtoolkit requires Python 2.7 (%d.%d detected)." %
+if sys.version_info[:2] < (3, 9):
+    print("mgtoolkit requires Python 3.9 or later (%d.%d detected)." %
           sys.version_info[:2])
     sys.exit(-1)
 
 
-# This is a plug-in for setuptools that will invoke py.test
-# when you run python setup.py test
-class PyTest(test_command):
-    # noinspection PyAttributeOutsideInit
-    def finalize_options(self):
-        test_command.finalize_options(self)
-        self.test_args = []
-        self.test_suite = True
-
-    def run_tests(self):
-        import pytest  # import here, because outside the required eggs aren't loaded yet
-        sys.exit(pytest.main(self.test_args))
+# single source of truth for the version, also read by the console script
+with open('mgtoolkit/_version.py') as version_file:
+    version = re.search(r"^__version__ = '([^']+)'", version_file.read(), re.M).group(1)
 
 with open('README.rst') as readme_file:
     readme = readme_file.read()
@@ -41,14 +29,14 @@ with open('HISTORY.rst') as history_file:
 requirements = [
     'Click>=6.0',
     'configobj==4.7.0',
-    'pytest==2.7.0',
-    'numpy==1.10.2'
+    'pytest>=7',
+    'numpy>=1.24'
 ]
 
 # noinspection PyPep8
 setup(
     name='mgtoolkit',
-    version='1.0.7',
+    version=version,
     description="This is a Python package for implementing metagraphss.",
     long_description=readme + '\n\n' + history,
     author="Dinesha Ranathunga",
@@ -71,14 +59,17 @@ setup(
         'Operating System :: POSIX :: Linux',
         'Topic :: System :: Networking',
         'Topic :: Scientific/Engineering :: Mathematics',
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Natural Language :: English'
     ],
 
     keywords="mgtoolkit, metagraph implementation, policy analysis",
     zip_safe=True,
     download_url = 'http://pypi.python.org/pypi/mgtoolkit',
-    tests_require=['pytest'],
 
     entry_points={
         'console_scripts': [
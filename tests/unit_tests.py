@@ -6,38 +6,62 @@ from mgtoolkit.library import Metagraph, ConditionalMetagraph, Edge, MetagraphHe
 class RunTests(unittest.TestCase):
 
     # noinspection PyPep8Naming
-    def setUp(self):
-        import numpy
-        t = numpy.version
-
-        self.generating_set1 = {1, 2, 3, 4, 5, 6, 7}
-        self.mg1 = Metagraph(self.generating_set1)
-        self.mg1.add_edges_from([Edge({1}, {2, 3}), Edge({1, 4}, {5}), Edge({3}, {6, 7})])
-
-        self.variable_set = set(range(1, 8))
-        self.propositions_set = {'p1', 'p2'}
-        self.cmg1 = ConditionalMetagraph(self.variable_set, self.propositions_set)
-        self.cmg1.add_edges_from([Edge({1, 2}, {3, 4}, attributes=['p1']), Edge({2}, {4, 6}, attributes=['p2']),
-                                  Edge({3, 4}, {5}, attributes=['p1', 'p2']), Edge({4, 6}, {5, 7}, attributes=['p1'])])
+    @classmethod
+    def setUpClass(cls):
+        cls.generating_set1 = {1, 2, 3, 4, 5, 6, 7}
+        cls.mg1 = Metagraph(cls.generating_set1)
+        cls.mg1.add_edges_from([Edge({1}, {2, 3}), Edge({1, 4}, {5}), Edge({3}, {6, 7})])
+        cls.mp_1_7 = cls.mg1.get_all_metapaths_from({1}, {7})
+
+        cls.variable_set = set(range(1, 8))
+        cls.propositions_set = {'p1', 'p2'}
+        cls.cmg1 = ConditionalMetagraph(cls.variable_set, cls.propositions_set)
+        cls.cmg1.add_edges_from([Edge({1, 2}, {3, 4}, attributes=['p1']), Edge({2}, {4, 6}, attributes=['p2']),
+                                 Edge({3, 4}, {5}, attributes=['p1', 'p2']), Edge({4, 6}, {5, 7}, attributes=['p1'])])
+
+        cls.generating_set2 = {1, 2, 3, 4, 5, 6, 7, 8}
+        cls.mg2_projection = Metagraph(cls.generating_set2)
+        cls.mg2_projection.add_edges_from([Edge({1}, {3, 4}), Edge({3}, {6}), Edge({2}, {5}), Edge({4, 5}, {7}),
+                                           Edge({6, 7}, {8})])
+        cls.mg2_inverse_efm = Metagraph(cls.generating_set2)
+        cls.mg2_inverse_efm.add_edges_from([Edge({1, 2}, {3, 4}), Edge({3, 4, 5}, {6, 8}), Edge({1}, {5}),
+                                            Edge({6, 7}, {1})])
 
     def test_mg_creation(self):
         self.assertEqual(len(self.mg1.edges), 3)
         self.assertEqual(len(self.mg1.nodes), 6)
 
+    def test_mg_labelled_parallel_edges(self):
+        # add_edge keeps parallel edges with different labels, add_edges_from does not
+        mg = Metagraph({1, 2})
+        mg.add_edge(Edge({1}, {2}, label='e1'))
+        mg.add_edge(Edge({1}, {2}, label='e2'))
+        mg.add_edge(Edge({1}, {2}, label='e2'))
+        self.assertEqual([edge.label for edge in mg.edges], ['e1', 'e2'])
+        mg.add_edges_from([Edge({1}, {2}, label='e3')])
+        self.assertEqual(len(mg.edges), 2)
+
+        mg.remove_edge(Edge({1}, {2}, label='e1'))
+        self.assertEqual([edge.label for edge in mg.edges], ['e2'])
+        mg.remove_edges_from([Edge({1}, {2}, label='e2')])
+        self.assertEqual(mg.edges, [])
+        mg.add_edges_from([Edge({1}, {2}, label='e3')])
+        self.assertEqual([edge.label for edge in mg.edges], ['e3'])
+
     def test_mg_adjacency_matrix(self):
         adj_matrix = self.mg1.adjacency_matrix()
-        row_count = adj_matrix.shape[0]
-        col_count = adj_matrix.shape[1]
-        row1 = adj_matrix[0, :]
-        col1 = adj_matrix[:, 0]
+        row_count = len(adj_matrix)
+        col_count = len(adj_matrix[0])
+        row1 = adj_matrix[0]
+        col1 = [row[0] for row in adj_matrix]
         self.assertEqual(row_count, 7)
         self.assertEqual(col_count, 7)
-        self.assertEqual(len(row1.tolist()[0]), 7)
-        self.assertEqual(len(col1.tolist()), 7)
-        self.assertEqual(row1.tolist()[0][1][0].coinputs, None)
-        self.assertEqual(row1.tolist()[0][1][0].cooutputs, {3})
-        self.assertEqual(row1.tolist()[0][1][0].edges.invertex, {1})
-        self.assertEqual(row1.tolist()[0][1][0].edges.outvertex, {2, 3})
+        self.assertEqual(len(row1), 7)
+        self.assertEqual(len(col1), 7)
+        self.assertEqual(row1[1][0].coinputs, None)
+        self.assertEqual(row1[1][0].cooutputs, {3})
+        self.assertEqual(row1[1][0].edges.invertex, {1})
+        self.assertEqual(row1[1][0].edges.outvertex, {2, 3})
 
     def test_mg_incidence_matrix(self):
         incidence_m = self.mg1.incidence_matrix()
@@ -47,30 +71,61 @@ class RunTests(unittest.TestCase):
         col1 = incidence_m[:, 0]
         self.assertEqual(row_count, 7)
         self.assertEqual(col_count, 3)
-        self.assertEqual(len(row1.tolist()[0]), 3)
-        self.assertEqual(len(col1.tolist()), 7)
-        self.assertEqual(row1.tolist()[0], [-1, -1, None])
+        self.assertEqual(row1.shape[1], 3)
+        self.assertEqual(col1.shape[0], 7)
+        self.assertEqual([incidence_m[0, j] for j in range(col_count)], [-1, -1, None])
 
     def test_mg_closure(self):
         a_star = self.mg1.get_closure()
-        row_count = a_star.shape[0]
-        col_count = a_star.shape[1]
-        row1 = a_star[0, :]
-        col1 = a_star[:, 0]
+        row_count = len(a_star)
+        col_count = len(a_star[0])
+        row1 = a_star[0]
+        col1 = [row[0] for row in a_star]
         self.assertEqual(row_count, 7)
         self.assertEqual(col_count, 7)
-        self.assertEqual(len(row1.tolist()[0]), 7)
-        self.assertEqual(len(col1.tolist()), 7)
-        self.assertEqual(row1.tolist()[0][3], None)
-        self.assertEqual(row1.tolist()[0][4][0].coinputs, {4})
-        self.assertEqual(row1.tolist()[0][4][0].cooutputs, None)
-        self.assertEqual(row1.tolist()[0][4][0].edges.invertex, {1, 4})
-        self.assertEqual(row1.tolist()[0][4][0].edges.outvertex, {5})
+        self.assertEqual(len(row1), 7)
+        self.assertEqual(len(col1), 7)
+        self.assertEqual(row1[3], None)
+        self.assertEqual(row1[4][0].coinputs, {4})
+        self.assertEqual(row1[4][0].cooutputs, None)
+        self.assertEqual(row1[4][0].edges.invertex, {1, 4})
+        self.assertEqual(row1[4][0].edges.outvertex, {5})
+
+    def test_mg_matrix_caching(self):
+        from unittest import mock
+        helper = MetagraphHelper()
+        mg = Metagraph(self.generating_set1)
+        mg.add_edges_from([Edge({1}, {2, 3}), Edge({3}, {6, 7})])
+        adj_matrix = mg.adjacency_matrix()
+        a_star = mg.get_closure()
+
+        # repeated calls reuse the cached matrices instead of rebuilding them
+        with mock.patch.object(helper, 'get_null_matrix', wraps=helper.get_null_matrix) as build:
+            self.assertEqual(mg.adjacency_matrix(), adj_matrix)
+            self.assertEqual(build.call_count, 0)
+        with mock.patch.object(helper, 'multiply_adjacency_matrices',
+                               wraps=helper.multiply_adjacency_matrices) as build:
+            self.assertEqual(mg.get_closure(), a_star)
+            self.assertEqual(build.call_count, 0)
+        self.assertEqual(mg.incidence_matrix().tolist(), mg.incidence_matrix().tolist())
+
+        # returned matrices are copies, editing them leaves the cached ones intact
+        mg.adjacency_matrix()[0][1] = None
+        mg.get_closure()[0][5].clear()
+        self.assertEqual(mg.adjacency_matrix(), adj_matrix)
+        self.assertEqual(mg.get_closure(), a_star)
+        self.assertEqual(len(mg.get_all_metapaths_from({1}, {7})), 1)
+
+        mg.add_edge(Edge({1, 4}, {5}))
+        with mock.patch.object(helper, 'get_null_matrix', wraps=helper.get_null_matrix) as build:
+            self.assertNotEqual(mg.adjacency_matrix(), adj_matrix)
+            self.assertEqual(build.call_count, 1)
+        self.assertNotEqual(mg.get_closure(), a_star)
+        self.assertEqual(mg.incidence_matrix().shape[1], 3)
+        self.assertEqual(mg.get_closure()[0][4][0].coinputs, {4})
 
     def test_mg_metapaths(self):
-        source = {1}
-        target = {7}
-        metapaths = self.mg1.get_all_metapaths_from(source, target)
+        metapaths = self.mp_1_7
 
         self.assertEqual(len(metapaths), 1)
         self.assertEqual(metapaths[0].source, {1})
@@ -101,7 +156,7 @@ class RunTests(unittest.TestCase):
     def test_edge_properties(self):
         source = {1}
         target = {7}
-        metapaths = self.mg1.get_all_metapaths_from(source, target)
+        metapaths = self.mp_1_7
         redundant = self.mg1.is_redundant_edge(Edge({1}, {2, 3}), metapaths[0], source, target)
         self.assertEqual(redundant, False)
 
@@ -111,35 +166,96 @@ class RunTests(unittest.TestCase):
         self.assertEqual(is_cutset, True)
         self.assertEqual(is_bridge, True)
 
+    def test_edge_properties_overlapping_source_target(self):
+        mg = Metagraph({1, 2, 3})
+        mg.add_edges_from([Edge({1}, {3})])
+        edge_list = [Edge({1}, {3})]
+        self.assertEqual(mg.get_all_metapaths_from({1, 2}, {2, 3}), None)
+        self.assertEqual(mg.is_cutset(edge_list, {1, 2}, {2, 3}), False)
+        self.assertEqual(mg.is_bridge(edge_list, {1, 2}, {2, 3}), False)
+
+    def test_edge_properties_cycle_unreachable_from_source(self):
+        # the {3} <-> {4} cycle reaches {1} without using the source
+        mg = Metagraph({1, 2, 3, 4})
+        mg.add_edges_from([Edge({2}, {1}), Edge({3}, {4}), Edge({4}, {3}), Edge({3}, {1})])
+        edge_list = [Edge({2}, {1})]
+        self.assertEqual(len(mg.get_all_metapaths_from({2}, {1})), 1)
+        self.assertEqual(mg.is_cutset(edge_list, {2}, {1}), True)
+        self.assertEqual(mg.is_bridge(edge_list, {2}, {1}), True)
+
+        # a cycle not fed by the source is no metapath from it
+        mg = Metagraph({1, 2, 3})
+        mg.add_edges_from([Edge({2}, {3}), Edge({3}, {2})])
+        edge_list = [Edge({2}, {3})]
+        self.assertEqual(mg.get_all_metapaths_from({1}, {2}), None)
+        self.assertEqual(mg.is_cutset(edge_list, {1}, {2}), False)
+        self.assertEqual(mg.is_bridge(edge_list, {1}, {2}), False)
+
+    def test_edge_properties_cyclic_metapath(self):
+        # {2, 3} -> {1} and {1} -> {2} feed each other, which is_metapath accepts
+        mg = Metagraph({1, 2, 3})
+        edge_list = [Edge({1}, {2}), Edge({2, 3}, {1})]
+        mg.add_edges_from(edge_list)
+        metapaths = mg.get_all_metapaths_from({3}, {1})
+        self.assertEqual(len(metapaths), 1)
+        self.assertEqual(mg.is_metapath(metapaths[0]), True)
+        self.assertEqual(mg.is_cutset(edge_list, {3}, {1}), True)
+        self.assertEqual(mg.is_bridge([Edge({2, 3}, {1})], {3}, {1}), True)
+        self.assertEqual(mg.is_bridge([Edge({1}, {2})], {3}, {1}), True)
+
+    def test_minimal_cutset(self):
+        # whenever metapaths are found, the minimal cutset breaks every one of them
+        mg = Metagraph({1, 2, 3})
+        mg.add_edges_from([Edge({1}, {2}), Edge({2, 3}, {1})])
+        self.assertEqual(mg.get_minimal_cutset({3}, {1}), [Edge({2, 3}, {1})])
+
+        mg = Metagraph({1, 2, 3, 4})
+        mg.add_edges_from([Edge({3}, {2, 4}), Edge({3, 4}, {1}), Edge({1, 2}, {3, 4}), Edge({1}, {2, 3})])
+        self.assertEqual(len(mg.get_all_metapaths_from({2, 4}, {4})), 5)
+        cutset = mg.get_minimal_cutset({2, 4}, {4})
+        self.assertEqual(cutset, [Edge({3, 4}, {1})])
+        self.assertEqual(mg.is_cutset(cutset, {2, 4}, {4}), True)
+
+        mg = Metagraph({1, 2, 3, 4})
+        mg.add_edges_from([Edge({2}, {1}), Edge({3}, {4}), Edge({4}, {3}), Edge({3}, {1})])
+        self.assertEqual(mg.get_minimal_cutset({2}, {1}), [Edge({2}, {1})])
+
     def test_mg_projection(self):
-        generating_set2 = {1, 2, 3, 4, 5, 6, 7, 8}
-        mg2 = Metagraph(generating_set2)
-        mg2.add_edges_from([Edge({1}, {3, 4}), Edge({3}, {6}), Edge({2}, {5}), Edge({4, 5}, {7}), Edge({6, 7}, {8})])
         generator_subset = {1, 2, 6, 7, 8}
-        projection = mg2.get_projection(generator_subset)
+        projection = self.mg2_projection.get_projection(generator_subset)
 
         self.assertEqual(len(projection.edges), 4)
         self.assertEqual(len(projection.nodes), 7)
 
     def test_mg_inverse(self):
-        generating_set2 = {1, 2, 3, 4, 5, 6, 7, 8}
-        mg2 = Metagraph(generating_set2)
-        mg2.add_edges_from([Edge({1, 2}, {3, 4}), Edge({3, 4, 5}, {6, 8}), Edge({1}, {5}), Edge({6, 7}, {1})])
-        inverse = mg2.get_inverse()
+        inverse = self.mg2_inverse_efm.get_inverse()
 
         self.assertEqual(len(inverse.edges), 6)
         self.assertEqual(len(inverse.nodes), 6)
 
     def test_mg_efm(self):
-        generating_set2 = {1, 2, 3, 4, 5, 6, 7, 8}
-        mg2 = Metagraph(generating_set2)
-        mg2.add_edges_from([Edge({1, 2}, {3, 4}), Edge({3, 4, 5}, {6, 8}), Edge({1}, {5}), Edge({6, 7}, {1})])
         generator_subset = {2, 4, 7}
-        efm = mg2.get_efm(generator_subset)
+        efm = self.mg2_inverse_efm.get_efm(generator_subset)
 
         self.assertEqual(len(efm.edges), 3)
         self.assertEqual(len(efm.nodes), 3)
 
+    def test_visualisation_cluster_edge(self):
+        import os
+        import tempfile
+        fd, file_path = tempfile.mkstemp(suffix='.dot')
+        os.close(fd)
+        try:
+            MetagraphHelper().generate_visualisation([Edge({'a', 'b'}, {'c'})], file_path)
+            with open(file_path) as dot_file:
+                dot_text = dot_file.read()
+        finally:
+            os.remove(file_path)
+
+        self.assertIn('subgraph cluster0', dot_text)
+        self.assertIn(' -> c [ltail=cluster0];', dot_text)
+        self.assertNotIn('frozenset', dot_text)
+
     def test_cmg_creation(self):
         self.assertEqual(len(self.cmg1.edges), 4)
         self.assertEqual(len(self.cmg1.nodes), 8)